@@ -0,0 +1,52 @@
+"""Compares two loadtest reports and fails on regressions, for CI.
+
+    python -m benchmarks.compare baseline.json report.json --threshold 0.2
+
+Exits with status 1 when a scenario's p95 grew by more than --threshold
+(a fraction, over a --min-ms noise floor), when it makes more queries per
+request, or when it has errors the baseline didn't.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_ms: float) -> list:
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            print(f'{name:>20}: new scenario')
+            continue
+        p95_before, p95_now = before["p95_ms"], now["p95_ms"]
+        change = (p95_now - p95_before) / p95_before if p95_before and p95_now is not None else 0.0
+        notes = []
+        if change > threshold and p95_now - p95_before > min_ms:
+            notes.append(f'p95 +{change:.0%}')
+        queries_before, queries_now = before["queries_per_request"], now["queries_per_request"]
+        if queries_before is not None and queries_now is not None and queries_now > queries_before:
+            notes.append(f'queries {queries_before} -> {queries_now}')
+        if now["errors"] and not before["errors"]:
+            notes.append(f'errors {json.dumps(now["errors"])}')
+        print(f'{name:>20}: p95 {p95_before or 0:8.2f} -> {p95_now or 0:8.2f} ms ({change:+.0%})  '
+              f'{before["throughput_rps"] or 0:8.1f} -> {now["throughput_rps"] or 0:8.1f} req/s'
+              f'{"  REGRESSION: " + ", ".join(notes) if notes else ""}')
+        if notes:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative p95 increase')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore p95 increases smaller than this')
+    args = parser.parse_args()
+    regressions = compare(load(args.baseline), load(args.current), args.threshold, args.min_ms)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,453 @@
+"""Latency, throughput and queries per request for every route in main.py.
+
+    python -m benchmarks.datagen --url sqlite:///bench.db --rows 100000
+    DATABASE_URL=sqlite:///bench.db ADMIN_TOKEN=bench python -m benchmarks.loadtest --requests 200 --concurrency 8 --out report.json
+    python -m benchmarks.compare baseline.json report.json
+
+By default the app is served by uvicorn on a background thread of this
+process, configured like the app itself (DATABASE_URL, ADMIN_TOKEN...), so
+queries can be counted on its engines. --base-url targets a server started
+elsewhere instead, without query counts. Each scenario first runs
+PROBE_REQUESTS requests one at a time to count queries, then --requests
+requests over --concurrency connections for latency and throughput.
+
+Write scenarios change the data, so regenerate it between runs that are
+compared. The response cache is bypassed unless --cache is given, so
+repeated parameters still reach the database. Admin scenarios are skipped
+without an admin token.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+from sqlalchemy import select, func, event
+from sqlalchemy.engine import make_url
+
+from benchmarks.datagen import user_row, WORDS, CITIES, RATE_TITLES, FEATURES
+from sql import models, database
+from sql.pagination import encode_cursor
+from sql.settings import settings
+
+PROBE_REQUESTS = 5
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    base_url: str
+    admin_token: str
+    rng: random.Random
+    users: int
+    items: int
+    tokens: Dict[int, str] = field(default_factory=dict)
+    # per-scenario state built by its prepare step (fresh users, rating ids...)
+    pool: list = field(default_factory=list)
+    # websockets the prepare step opened, closed once the scenario is done
+    sockets: list = field(default_factory=list)
+    serial: int = 0
+
+    def user(self) -> int:
+        return self.rng.randint(1, self.users)
+
+    def item(self) -> int:
+        return self.rng.randint(1, self.items)
+
+    def unique(self) -> int:
+        self.serial += 1
+        return self.serial
+
+    def admin(self) -> dict:
+        return {'admin-token': self.admin_token}
+
+    async def auth(self, user_id: Optional[int] = None) -> dict:
+        user_id = user_id or self.user()
+        if user_id not in self.tokens:
+            row = user_row(user_id)
+            response = await self.client.post('/login-token', data={'username': row['email'], 'password': row['phone']})
+            self.tokens[user_id] = response.json()['access_token']
+        return {'token': self.tokens[user_id]}
+
+
+@dataclass
+class Scenario:
+    name: str
+    # issues one request (for the socket, one round trip); worker is the index
+    # of the connection running it
+    call: Callable[[Context, int, int], Awaitable[httpx.Response]]
+    prepare: Optional[Callable[[Context, int], Awaitable[None]]] = None
+    ok: Set[int] = field(default_factory=lambda: {200})
+    admin: bool = False
+    # caps expensive scenarios (whole-table rebuilds)
+    max_requests: Optional[int] = None
+
+
+def new_user(ctx: Context) -> dict:
+    """Registration payload for a user that doesn't exist yet."""
+    number = ctx.users * 10 + ctx.unique() + int(time.time())
+    row = user_row(number)
+    del row['user_id']
+    return dict(row, phone=f'08{number % 10 ** 9:09d}', email=f'load{number}@bench.example',
+                date_of_birth=row['date_of_birth'].isoformat())
+
+
+def stay(ctx: Context):
+    entry = date(2026, 1, 1) + timedelta(days=ctx.rng.randint(0, 3000))
+    return entry, entry + timedelta(days=ctx.rng.randint(1, 7))
+
+
+def get(path: Callable[[Context], str], authenticated: bool = False) -> Callable:
+    async def call(ctx: Context, i: int, worker: int):
+        return await ctx.client.get(path(ctx), headers=await ctx.auth() if authenticated else None)
+    return call
+
+
+def search_path(ctx: Context) -> str:
+    state, city, _, _ = ctx.rng.choice(CITIES)
+    low = ctx.rng.randint(10, 400)
+    return f'/houses/?state={state}&city={city}&min_price={low}&max_price={low + 100}'
+
+
+def export_path(ctx: Context) -> str:
+    price = ctx.rng.randint(10, 500)
+    return f'/houses/?format=ndjson&min_price={price}&max_price={price}'
+
+
+def near_path(ctx: Context) -> str:
+    _, _, latitude, longitude = ctx.rng.choice(CITIES)
+    return f'/houses/near?lat={latitude}&lon={longitude}&radius={ctx.rng.choice([1, 5, 20])}&max_price={ctx.rng.randint(50, 500)}'
+
+
+def available_path(ctx: Context) -> str:
+    entry, exit = stay(ctx)
+    return f'/houses/available?entry={entry}&exit={exit}&guests={ctx.rng.randint(1, 6)}'
+
+
+async def host_report(ctx: Context, path: str):
+    # as the host themselves: reports are private
+    host = ctx.user()
+    return await ctx.client.get(f'/reports/host/{host}{path}', headers=await ctx.auth(host))
+
+
+async def prepare_users(ctx: Context, count: int):
+    ctx.pool = []
+    for _ in range(count):
+        row = new_user(ctx)
+        user = (await ctx.client.post('/register/user', json=row)).json()
+        login = await ctx.client.post('/login-token', data={'username': row['email'], 'password': row['phone']})
+        ctx.pool.append({'user_id': user['user_id'], 'token': login.json()['access_token']})
+
+
+async def prepare_ratings(ctx: Context, count: int):
+    ctx.pool = []
+    for _ in range(count):
+        # creating and deleting a rating both take its author's token
+        headers = await ctx.auth()
+        response = await ctx.client.post('/ratings', headers=headers, json={'item_id': ctx.item(), 'total_rate': 3})
+        ctx.pool.append({'rating_id': response.json()['rating_id'], 'headers': headers})
+
+
+async def prepare_job(ctx: Context, count: int):
+    response = await ctx.client.post('/admin/users/purge', headers=ctx.admin(), json={'user_ids': [], 'background': True})
+    ctx.pool = [response.json()['job_id']]
+
+
+async def prepare_sockets(ctx: Context, count: int):
+    import websockets
+    ctx.pool = []
+    url = ctx.base_url.replace('http', 'ws', 1)
+    for user_id in range(1, min(count, ctx.users) + 1):
+        token = (await ctx.auth(user_id))['token']
+        socket = await websockets.connect(f'{url}/ws/messages?token={token}')
+        ctx.sockets.append(socket)
+        ctx.pool.append((user_id, socket))
+
+
+async def login(ctx: Context, i: int, worker: int):
+    row = user_row(ctx.user())
+    return await ctx.client.post('/login-token', data={'username': row['email'], 'password': row['phone']})
+
+
+async def update_user(ctx: Context, i: int, worker: int):
+    user_id = ctx.user()
+    row = user_row(user_id)
+    del row['user_id']
+    row.update(date_of_birth=row['date_of_birth'].isoformat(), description=f'updated {i}')
+    return await ctx.client.put(f'/user-update/{user_id}', json=row)
+
+
+async def delete_user(ctx: Context, i: int, worker: int):
+    return await ctx.client.delete('/delete-user', headers={'token': ctx.pool[i]['token']})
+
+
+async def purge(ctx: Context, i: int, worker: int):
+    return await ctx.client.post('/admin/users/purge', headers=ctx.admin(), json={'user_ids': [ctx.pool[i]['user_id']]})
+
+
+async def bulk_features(ctx: Context, i: int, worker: int):
+    rows = '\n'.join(json.dumps({'item_id': ctx.item(), 'name': ctx.rng.choice(FEATURES)}) for _ in range(100))
+    return await ctx.client.post('/bulk/features', headers=ctx.admin(), content=rows, params={'format': 'ndjson'})
+
+
+async def rate(ctx: Context, i: int, worker: int):
+    rates = [{'rate_title': title, 'rate': ctx.rng.randint(1, 5)} for title in ctx.rng.sample(RATE_TITLES, 2)]
+    return await ctx.client.post('/ratings', headers=await ctx.auth(), json={
+        'item_id': ctx.item(), 'total_rate': ctx.rng.randint(1, 5), 'rates': rates})
+
+
+async def reserve(ctx: Context, i: int, worker: int):
+    entry, exit = stay(ctx)
+    return await ctx.client.post('/reservations', json={
+        'renter_id': ctx.user(), 'item_id': ctx.item(), 'entry_date': entry.isoformat(), 'exit_date': exit.isoformat(),
+        'passengers_number': 2, 'final_price': 100})
+
+
+async def send_message(ctx: Context, i: int, worker: int):
+    return await ctx.client.post('/messages', headers=await ctx.auth(),
+                                 json={'receiver_id': ctx.user(), 'item_id': ctx.item(), 'text': 'load test'})
+
+
+async def push(ctx: Context, i: int, worker: int):
+    # sends a message to the socket's user and waits until it is pushed back
+    receiver, socket = ctx.pool[worker % len(ctx.pool)]
+    sender = receiver % ctx.users + 1
+    response = await ctx.client.post('/messages', headers=await ctx.auth(sender),
+                                     json={'receiver_id': receiver, 'item_id': ctx.item(), 'text': 'ping'})
+    message_id = response.json()['message_id']
+    while json.loads(await asyncio.wait_for(socket.recv(), 10))['message_id'] != message_id:
+        pass
+    return response
+
+
+async def create_house(ctx: Context, i: int, worker: int):
+    return await ctx.client.post('/create-house', json={
+        'owner_id': ctx.user(), 'name': f'load house {ctx.unique()}', 'price': ctx.rng.randint(10, 500), 'about': f'load test {time.time()}'})
+
+
+async def add_favorite(ctx: Context, i: int, worker: int):
+    return await ctx.client.post('/favorites/add', json={'user_id': ctx.user(), 'item_id': ctx.item()})
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario('root', get(lambda ctx: '/')),
+    Scenario('health_db', get(lambda ctx: '/health/db')),
+    Scenario('openapi', get(lambda ctx: '/openapi.json')),
+    Scenario('users_page', get(lambda ctx: f'/users?limit=20&cursor={encode_cursor([ctx.user()])}')),
+    Scenario('user_get', get(lambda ctx: f'/users/{ctx.user()}')),
+    Scenario('register_user', lambda ctx, i, worker: ctx.client.post('/register/user', json=new_user(ctx))),
+    Scenario('login_token', login),
+    Scenario('loged_user', get(lambda ctx: '/loged-user', authenticated=True)),
+    Scenario('user_update', update_user),
+    Scenario('delete_user', delete_user, prepare=prepare_users),
+    Scenario('admin_purge', purge, prepare=prepare_users, admin=True),
+    Scenario('admin_job', lambda ctx, i, worker: ctx.client.get(f'/admin/jobs/{ctx.pool[0]}', headers=ctx.admin()),
+             prepare=prepare_job, admin=True),
+    Scenario('bulk_features', bulk_features, admin=True),
+    Scenario('houses_filter', get(search_path)),
+    Scenario('houses_facets', get(lambda ctx: search_path(ctx) + '&facets=true')),
+    Scenario('houses_text', get(lambda ctx: f'/houses/?q={ctx.rng.choice(WORDS)}')),
+    Scenario('houses_price_sort', get(lambda ctx: f'/houses/?sort=-price&max_price={ctx.rng.randint(20, 500)}')),
+    Scenario('houses_rating_sort', get(lambda ctx: f'/houses/?sort=-rating&min_rating={ctx.rng.randint(1, 4)}')),
+    Scenario('houses_export', get(export_path)),
+    Scenario('houses_full_batch', get(lambda ctx: '/houses/full?' + '&'.join(f'ids={ctx.item()}' for _ in range(20)))),
+    Scenario('house_full', get(lambda ctx: f'/houses/{ctx.item()}/full')),
+    Scenario('house_rating', get(lambda ctx: f'/houses/{ctx.item()}/rating')),
+    Scenario('houses_available', get(available_path)),
+    Scenario('houses_near', get(near_path)),
+    Scenario('rating_create', rate),
+    Scenario('rating_delete', lambda ctx, i, worker: ctx.client.delete(f'/ratings/{ctx.pool[i]["rating_id"]}', headers=ctx.pool[i]['headers']),
+             prepare=prepare_ratings),
+    Scenario('ratings_rebuild', lambda ctx, i, worker: ctx.client.post('/admin/ratings/rebuild', headers=ctx.admin()),
+             admin=True, max_requests=10),
+    Scenario('reservation_create', reserve, ok={200, 409}),
+    Scenario('travels', get(lambda ctx: f'/users/{ctx.user()}/travels')),
+    Scenario('travels_export', get(lambda ctx: f'/users/{ctx.user()}/travels?format=csv')),
+    Scenario('host_report', lambda ctx, i, worker: host_report(ctx, '')),
+    Scenario('host_occupancy', lambda ctx, i, worker: host_report(ctx, '/occupancy')),
+    Scenario('reports_refresh', lambda ctx, i, worker: ctx.client.post('/admin/reports/refresh', headers=ctx.admin()), admin=True),
+    Scenario('messages_pair', get(lambda ctx: f'/messages/{ctx.user()}/{ctx.user()}')),
+    Scenario('all_messages', get(lambda ctx: f'/all-messages/{ctx.user()}')),
+    Scenario('all_messages_export', get(lambda ctx: f'/all-messages/{ctx.user()}?format=ndjson')),
+    Scenario('inbox', get(lambda ctx: '/inbox', authenticated=True)),
+    Scenario('inbox_thread', get(lambda ctx: f'/inbox/{ctx.user()}/{ctx.item()}', authenticated=True)),
+    Scenario('message_send', send_message),
+    Scenario('ws_push', push, prepare=prepare_sockets),
+    Scenario('create_house', create_house),
+    # a random pair is sometimes already a favorite
+    Scenario('favorites_add', add_favorite, ok={200, 403}),
+]
+
+
+class QueryCounter:
+    """Counts statements on the app's engines (in-process server only)."""
+
+    def __init__(self, db: database.Database):
+        self.count = 0
+        self._lock = threading.Lock()
+        for target in (db.engine, db.async_engine.sync_engine):
+            event.listen(target, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    # nearest rank
+    ordered = sorted(samples)
+    rank = -(-pct * len(ordered) // 100)
+    return ordered[max(0, int(rank) - 1)]
+
+
+async def run_scenario(ctx: Context, scenario: Scenario, requests: int, concurrency: int, counter: Optional[QueryCounter]) -> dict:
+    requests = min(requests, scenario.max_requests or requests)
+    probes = min(PROBE_REQUESTS, requests)
+    if scenario.prepare:
+        await scenario.prepare(ctx, probes + requests)
+    errors: Dict[str, int] = {}
+
+    def record(outcome: str):
+        errors[outcome] = errors.get(outcome, 0) + 1
+
+    queries = None
+    before = counter.count if counter else 0
+    for i in range(probes):
+        response = await scenario.call(ctx, i, 0)
+        if response.status_code not in scenario.ok:
+            record(str(response.status_code))
+    if counter and probes:
+        queries = round((counter.count - before) / probes, 2)
+
+    samples: List[float] = []
+    indexes = iter(range(probes, probes + requests))
+
+    async def worker(number: int):
+        for i in indexes:
+            start = time.perf_counter()
+            try:
+                response = await scenario.call(ctx, i, number)
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                record(type(e).__name__)
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code not in scenario.ok:
+                record(str(response.status_code))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(number) for number in range(concurrency)])
+    seconds = time.perf_counter() - start
+    for socket in ctx.sockets:
+        await socket.close()
+    ctx.pool, ctx.sockets = [], []
+    result = {"requests": requests, "errors": errors}
+    if samples:
+        result.update({
+            "p50_ms": round(percentile(samples, 50), 3),
+            "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3),
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "throughput_rps": round(len(samples) / seconds, 1),
+        })
+    else:
+        result.update(dict.fromkeys(["p50_ms", "p95_ms", "p99_ms", "mean_ms", "throughput_rps"]))
+    result["queries_per_request"] = queries
+    return result
+
+
+def start_server(cache: bool = True):
+    import uvicorn
+    import main
+    if not cache:
+        main.app.state.response_cache.local.maxsize, main.app.state.response_cache.shared = 0, None
+    server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=0, log_level='warning'))
+
+    thread = threading.Thread(target=asyncio.run, args=(server.serve(),), daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, f'http://127.0.0.1:{port}'
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def dataset_size() -> Dict[str, int]:
+    async with database.current().async_session_factory() as db:
+        return {"users": await db.scalar(select(func.max(models.USER.user_id))),
+                "items": await db.scalar(select(func.max(models.Item.item_id)))}
+
+
+async def main(args):
+    server = counter = None
+    base_url, admin_token = args.base_url, args.admin_token
+    sizes = {"users": args.users, "items": args.items} if args.users and args.items else await dataset_size()
+    if base_url is None:
+        # the server has a Database of its own; these connections belong to this loop
+        await database.current().dispose()
+        server, thread, base_url = start_server(cache=args.cache)
+        counter = QueryCounter(server.config.app.state.database)
+        admin_token = admin_token or settings.admin_token
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios.split(',')]
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "database": make_url(settings.database_url).get_backend_name() if server else None,
+            "base_url": args.base_url,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "response_cache": args.cache,
+            **sizes,
+        },
+        "scenarios": {},
+    }
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=args.concurrency * 2), timeout=60) as client:
+        ctx = Context(client=client, base_url=base_url, admin_token=admin_token, rng=random.Random(args.seed), **sizes)
+        for scenario in selected:
+            if scenario.admin and not admin_token:
+                print(f'{scenario.name:>20}: skipped, no admin token')
+                continue
+            result = await run_scenario(ctx, scenario, args.requests, args.concurrency, counter)
+            report["scenarios"][scenario.name] = result
+            queries = result["queries_per_request"]
+            print(f'{scenario.name:>20}: p50 {result["p50_ms"] or 0:8.2f}  p95 {result["p95_ms"] or 0:8.2f}  '
+                  f'p99 {result["p99_ms"] or 0:8.2f} ms  {result["throughput_rps"] or 0:8.1f} req/s  '
+                  f'{"-" if queries is None else queries:>6} q/req'
+                  f'{"  errors " + json.dumps(result["errors"]) if result["errors"] else ""}', flush=True)
+    if server is not None:
+        server.should_exit = True
+        thread.join()
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='benchmark an already running server, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--admin-token', help='defaults to ADMIN_TOKEN for the in-process server')
+    parser.add_argument('--users', type=int, help='dataset size; read from the database when omitted')
+    parser.add_argument('--items', type=int)
+    parser.add_argument('--requests', type=int, default=100, help='timed requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenarios', help='comma-separated subset, e.g. houses_filter,house_full')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help='leave the response cache on')
+    parser.add_argument('--out', help='write the JSON report here')
+    asyncio.run(main(parser.parse_args()))
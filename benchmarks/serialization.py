@@ -0,0 +1,62 @@
+"""Serialization cost of list responses: FastAPI's default path against the
+cached TypeAdapter + pydantic-core JSON path used by the list endpoints.
+
+    python -m benchmarks.serialization --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import time
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from sql import models, schemas, serializers
+
+
+def make_items(rows: int) -> list:
+    return [models.Item(item_id=i, owner_id=i % 97, name=f'house {i}', price=100 + i % 400, about='garden view ' * 4)
+            for i in range(rows)]
+
+
+def make_messages(rows: int) -> list:
+    return [models.Message(message_id=i, sender_id=i % 89, receiver_id=i % 97, item_id=i % 1000, text='hello there ' * 6)
+            for i in range(rows)]
+
+
+def fastapi_default(schema, objects) -> bytes:
+    # what a response_model route did before: validate, jsonable_encoder, json.dumps
+    validated = [schema.model_validate(obj) for obj in objects]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def orjson_dicts(schema, objects) -> bytes:
+    return orjson.dumps([schema.model_validate(obj).model_dump(mode='json') for obj in objects])
+
+
+def type_adapter(schema, objects) -> bytes:
+    return serializers.dump_json(List[schema], objects)
+
+
+def best_of(fn, schema, objects, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(schema, objects)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main(args):
+    datasets = [('Item', schemas.Item, make_items(args.rows)), ('Message', schemas.Message, make_messages(args.rows))]
+    for label, schema, objects in datasets:
+        for name, fn in [('jsonable_encoder', fastapi_default), ('orjson', orjson_dicts), ('TypeAdapter', type_adapter)]:
+            elapsed = best_of(fn, schema, objects, args.repeat)
+            print(f'{label:>8} {name:>17}: {elapsed:8.2f} ms per {args.rows} rows')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    main(parser.parse_args())
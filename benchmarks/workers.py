@@ -0,0 +1,102 @@
+"""Checks that serve.py's workers share no database connection.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.workers --workers 4 --requests 400
+
+Starts serve.py on a free port, sends --requests requests to /health/db
+over --concurrency new connections at a time, so they are spread over the
+workers, and groups the answers by the worker that served them. Exits
+with status 1 on a failed request, when a single worker served them all,
+or, on Postgres, when two workers report the same server process (one
+connection used by both).
+"""
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+# seconds to wait for the workers to start
+STARTUP_TIMEOUT = 60
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'serve.py exited with status {process.returncode}')
+        try:
+            if (await client.get('/health/db')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('serve.py did not start in time')
+
+
+async def fire(base_url: str, process: subprocess.Popen, requests: int, concurrency: int) -> list:
+    # no keep-alive: each request is a new connection, which any worker may accept
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await wait_ready(client, process)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                response = await client.get('/health/db')
+                return response.status_code, response.json()
+
+        return await asyncio.gather(*[one() for _ in range(requests)])
+
+
+def check(results: list) -> list:
+    problems = []
+    failed = [report for code, report in results if code != 200]
+    if failed:
+        problems.append(f'{len(failed)} failed requests, e.g. {failed[0]}')
+    served = defaultdict(int)
+    backends = defaultdict(set)
+    for code, report in results:
+        served[report["worker"]] += 1
+        if report.get("backend_pid") is not None:
+            backends[report["backend_pid"]].add(report["worker"])
+    for worker, count in sorted(served.items()):
+        connections = sorted(backend for backend, workers in backends.items() if worker in workers)
+        print(f'worker {worker}: {count} requests' + (f', server processes {connections}' if connections else ''))
+    if len(served) < 2:
+        problems.append('all requests were served by one worker')
+    shared = {backend: sorted(workers) for backend, workers in backends.items() if len(workers) > 1}
+    if shared:
+        problems.append(f'connections used by more than one worker: {shared}')
+    return problems
+
+
+def main(args) -> int:
+    port = free_port()
+    process = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(args.workers), '--port', str(port)])
+    try:
+        results = asyncio.run(fire(f'http://127.0.0.1:{port}', process, args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait()
+    problems = check(results)
+    for problem in problems:
+        print(f'FAILED: {problem}')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=32)
+    sys.exit(main(parser.parse_args()))
@@ -1,44 +1,87 @@
-from datetime import timedelta
-from fastapi import FastAPI, Depends, HTTPException,status, Header
+import logging
+import os
+import time
+import orjson
+from datetime import date, timedelta
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Depends, HTTPException,status, BackgroundTasks, Request, Query, WebSocket
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import JWTError
-from sqlalchemy.orm import Session
-from typing import Annotated, List, Optional
-from sql import models, schemas, auth
-from sql.database import SessionLocal, engine, get_db
+from sqlalchemy import select, delete, text, func, literal_column, Float
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import with_expression, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, List, Literal, Optional
+from sql import models, schemas, auth, pagination, search, accounts, jobs, bulk, export, serializers, availability, ratings, inbox, metrics, upsert, updates, geo, facets, reports, database
+from sql.broker import LocalBroker, get_broker, make_broker, relay
+from sql.cache import ResponseCache, get_response_cache, make_cache
+from sql.database import get_async_db, get_read_db
+from sql.pool import pool_status
+from sql.replicas import ReadYourWritesMiddleware
+from sql.settings import Settings, settings
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
+router = APIRouter()
 
-@app.get('/')
+
+@router.get('/')
 def read_root():
     return {'Hello': 'World'}
 
-@app.get('/users')
-def read_users(limit: int, db: Annotated[Session, Depends(get_db)]):
-    return db.query(models.USER).limit(limit).all()
+@router.get('/health/db')
+async def health_db(request: Request):
+    db = database.of(request)
+    report = {"worker": os.getpid(), "pool": pool_status(db.async_engine.pool), "replicas": db.read_router.status(),
+              "startup": getattr(request.app.state, 'startup', None)}
+    start = time.perf_counter()
+    try:
+        async with db.async_engine.connect() as conn:
+            if conn.dialect.name == 'postgresql':
+                # which server process this worker's connection is, to tell
+                # workers' connections apart
+                report["backend_pid"] = await conn.scalar(text('SELECT pg_backend_pid()'))
+            else:
+                await conn.execute(text('SELECT 1'))
+    except Exception as e:
+        report.update({"status": "unavailable", "error": str(e)})
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=report)
+    report.update({"status": "ok", "ping_ms": round((time.perf_counter() - start) * 1000, 3)})
+    return report
+
+@router.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(request: Request):
+    db = database.of(request)
+    pools = {"sync": pool_status(db.engine.pool), "async": pool_status(db.async_engine.pool)}
+    pools.update({f'replica{replica["replica"]}': replica["pool"] for replica in db.read_router.status()})
+    return PlainTextResponse(metrics.render(pools), media_type='text/plain; version=0.0.4')
 
-@app.get('/users/{user_id}', response_model=schemas.UserBase)
-def read_user(user_id: int, db: Annotated[Session, Depends(get_db)]):
-    user = db.query(models.USER).filter(models.USER.user_id == user_id).first()
+@router.get('/users', response_model=schemas.UserPage)
+async def read_users(db: Annotated[AsyncSession, Depends(get_read_db)], limit: int = pagination.DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    limit = pagination.clamp_limit(limit)
+    keys = [models.USER.user_id]
+    users = await db.scalars(pagination.keyset(select(models.USER), keys, cursor, limit))
+    items, next_cursor = pagination.page(users.all(), keys, limit)
+    return serializers.json_response(schemas.UserPage, {"items": items, "next_cursor": next_cursor})
+
+@router.get('/users/{user_id}', response_model=schemas.UserBase)
+async def read_user(user_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]):
+    user = await db.scalar(select(models.USER).where(models.USER.user_id == user_id))
     return user
 
-@app.post('/register/user')
-def create_user(user: schemas.UserBase, db: Annotated[Session, Depends(get_db)]):
-    isTaken = db.query(models.USER).filter(models.USER.phone == user.phone).first()
-    if isTaken:
+@router.post('/register/user')
+async def create_user(user: schemas.UserBase, db: Annotated[AsyncSession, Depends(get_async_db)]):
+    db_user = await upsert.insert_new(db, models.USER, user.model_dump(), [models.USER.phone])
+    if db_user is None:
         raise HTTPException(status_code=404, detail=f"User with phone {user.phone} already exists")
-
-    db_user = models.USER(**user.dict())
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return db_user
 
-@app.post('/login-token')
-async def login_for_access_token(db: Annotated[Session, Depends(get_db)], form_data: OAuth2PasswordRequestForm = Depends()):
-    user = db.query(models.USER).filter(models.USER.email == form_data.username, models.USER.phone == form_data.password).first()
+@router.post('/login-token')
+async def login_for_access_token(request: Request, db: Annotated[AsyncSession, Depends(get_async_db)],
+                                 form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await db.scalar(select(models.USER).where(models.USER.email == form_data.username, models.USER.phone == form_data.password))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,7 +90,7 @@ async def login_for_access_token(db: Annotated[Session, Depends(get_db)], form_d
         )
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email}, secret_key=request.app.state.settings.secret_key, expires_delta=access_token_expires
     )
     return {
         "message": "Login Successful",
@@ -55,80 +98,505 @@ async def login_for_access_token(db: Annotated[Session, Depends(get_db)], form_d
         "access_token": access_token, "token_type": "bearer"
     }
 
-@app.get("/loged-user", response_model=schemas.UserBase)
-async def get_current_user(db: Annotated[Session, Depends(get_db)], token: str = Header(...)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.USER).filter(models.USER.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+@router.get("/loged-user", response_model=schemas.UserBase)
+async def get_current_user(current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)]):
+    return current_user
 
-@app.put('/user-update/{user_id}', response_model=schemas.UserUpdate)
-def update_user(user_id: int, user: schemas.UserUpdate, db: Annotated[Session, Depends(get_db)]):
-    db_user = db.query(models.USER).filter(models.USER.user_id == user_id).first()
+@router.put('/user-update/{user_id}', response_model=schemas.UserUpdate)
+async def update_user(user_id: int, user: schemas.UserUpdate, db: Annotated[AsyncSession, Depends(get_async_db)],
+                      broker: Annotated[LocalBroker, Depends(get_broker)], user_cache: Annotated[auth.UserCache, Depends(auth.get_user_cache)]):
+    try:
+        db_user = await updates.update_row(db, models.USER, user_id, user.model_dump(exclude_unset=True))
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"User with phone {user.phone} already exists")
     if not db_user:
         raise HTTPException(status_code= status.HTTP_404_NOT_FOUND, detail="User not found")
-    for key, value in user.dict(exclude_unset=True).items():
-        setattr(db_user, key, value)
-    db.commit()
-    db.refresh(db_user)
+    await broker.users_changed(db, [user_id])
+    await db.commit()
+    user_cache.invalidate_user(user_id)
     return db_user
 
-@app.delete("/delete-user")
-async def delete_user(db: Annotated[Session, Depends(get_db)], token: str = Header(...)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+@router.patch('/users', response_model=schemas.BulkUpdateResult, dependencies=[Depends(auth.require_admin)])
+async def update_users(users: List[schemas.UserBulkUpdate], db: Annotated[AsyncSession, Depends(get_async_db)],
+                       broker: Annotated[LocalBroker, Depends(get_broker)], user_cache: Annotated[auth.UserCache, Depends(auth.get_user_cache)]):
     try:
-        payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    current_user = db.query(models.USER).filter(models.USER.email == email).first()
-    if current_user is None:
-        raise credentials_exception
-        return False
-
-    db_user = db.query(models.USER).filter(models.USER.email == current_user.email, models.USER.phone == current_user.phone).first()
+        updated, missing = await updates.update_many(db, models.USER, [user.model_dump(exclude_unset=True) for user in users])
+        await broker.users_changed(db, updated)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duplicate phone number")
+    for user_id in updated:
+        user_cache.invalidate_user(user_id)
+    return {"updated": updated, "missing": missing}
+
+@router.delete("/delete-user")
+async def delete_user(request: Request, db: Annotated[AsyncSession, Depends(get_async_db)],
+                      current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)]):
+    db_user = await accounts.purge_user(db, request.app.state, current_user.user_id)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    if db_user.email != current_user.email or db_user.phone != current_user.phone:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to take action")
-    #deleting other relations
-    db.query(models.Like).filter(models.Like.user_id == db_user.user_id).delete()
-    db.query(models.Item).filter(models.Item.owner_id == db_user.user_id).delete()
-    db.query(models.Rating).filter(models.Rating.user_id == db_user.user_id).delete()
-    db.query(models.Rate).filter(models.Rate.user_id == db_user.user_id).delete()
-    db.query(models.Message).filter(models.Message.sender_id == db_user.user_id or models.Message.receiver_id == db_user.user_id).delete()
-    db.query(models.CommentSection).filter(models.CommentSection.user_id == db_user.user_id).delete()
-    db.query(models.Reservation).filter(models.Reservation.renter_id == db_user.user_id).delete()
-    db.query(models.Invoice).filter(models.Invoice.user_id == db_user.user_id).delete()
-
-
-    db.delete(db_user)
-    db.commit()
     return {
         "message": "User deleted",
         "user": db_user
     }
 
-# Add the OpenAPI customization
-def custom_openapi():
+@router.post("/admin/users/purge", dependencies=[Depends(auth.require_admin)])
+async def purge_users(purge: schemas.PurgeUsers, background_tasks: BackgroundTasks, request: Request,
+                      db: Annotated[AsyncSession, Depends(get_async_db)]):
+    if purge.background:
+        job = await jobs.create(db, "purge_users")
+        # the task outlives the request's session, so it opens its own
+        background_tasks.add_task(accounts.run_purge_job, request.app.state, job["job_id"], purge.user_ids)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job)
+    return schemas.PurgeResult(deleted=await accounts.purge_users(db, request.app.state, purge.user_ids))
+
+@router.get("/admin/jobs/{job_id}", response_model=schemas.Job, dependencies=[Depends(auth.require_admin)])
+async def get_job(job_id: str, db: Annotated[AsyncSession, Depends(get_async_db)]):
+    job = await jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@router.post("/bulk/{kind}", response_model=schemas.ImportReport, dependencies=[Depends(auth.require_admin)])
+async def bulk_import(kind: Literal['users', 'items', 'locations', 'item-descriptions', 'features'], request: Request,
+                      db: Annotated[AsyncSession, Depends(get_async_db)], response_cache: Annotated[ResponseCache, Depends(get_response_cache)],
+                      format: Optional[Literal['ndjson', 'csv']] = None, batch_size: int = bulk.DEFAULT_BATCH_SIZE):
+    if format is None:
+        format = 'csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson'
+    parse = bulk.parse_csv if format == 'csv' else bulk.parse_ndjson
+    report = await bulk.import_rows(db, kind, parse(request.stream()), batch_size)
+    if report["inserted"]:
+        await response_cache.invalidate()
+    return report
+
+HOUSE_SORT_KEYS = {
+    'item_id': ([models.Item.item_id], False),
+    'price': ([models.Item.price, models.Item.item_id], False),
+    '-price': ([models.Item.price, models.Item.item_id], True),
+}
+# typed like a column, for decoding /houses/near cursors
+NEAR_DISTANCE = literal_column('distance_km', Float)
+# unrated houses sort as 0
+RATING_KEY = func.coalesce(models.ItemRating.rating, 0.0).label('rating')
+
+@router.get("/houses/", response_model=schemas.ItemSearchPage)
+async def search_houses(request: Request, q: Optional[str] = None, name: Optional[str] = None, state: Optional[str] = None, city: Optional[str] = None,
+                  min_price: Optional[float] = None, max_price: Optional[float] = None, min_rating: Optional[float] = None,
+                  sort: Optional[Literal['relevance', 'item_id', 'price', '-price', 'rating', '-rating']] = None, cursor: Optional[str] = None,
+                  limit: int = pagination.DEFAULT_PAGE_SIZE, format: Optional[Literal['json', 'ndjson', 'csv']] = None,
+                  facets: bool = False, db: AsyncSession = Depends(get_read_db), response_cache: ResponseCache = Depends(get_response_cache)):
+    stream_format = export.export_format(request, format)
+    if not stream_format:
+        cached = await response_cache.lookup(request)
+        if cached:
+            return cached
+    query = select(models.Item)
+    if sort is None:
+        sort = 'relevance' if q else 'item_id'
+    if sort == 'relevance' and not q:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sort=relevance requires q")
+
+    if q:
+        ranked = await search.ranked(db, q)
+        query = query.join(ranked, ranked.c.item_id == models.Item.item_id)
+
+    if name:
+        query = query.where(models.Item.name.contains(name))
+    if state or city:
+        query = query.join(models.Location)
+        if state:
+            query = query.where(models.Location.state.contains(state))
+        if city:
+            query = query.where(models.Location.city.contains(city))
+    if min_price is not None:
+        query = query.where(models.Item.price >= min_price)
+    if max_price is not None:
+        query = query.where(models.Item.price <= max_price)
+    if min_rating is not None or sort in ('rating', '-rating'):
+        # read from the precomputed aggregates, never from the raw ratings
+        query = query.outerjoin(models.ItemRating)
+        if min_rating is not None:
+            query = query.where(models.ItemRating.rating >= min_rating)
+    facet_counts = None
+    if facets and not stream_format:
+        facet_counts = await search_facets(db, request, query.with_only_columns(models.Item.item_id).distinct().subquery())
+    if q:
+        query = query.options(with_expression(models.Item.relevance, ranked.c.relevance))
+    if min_rating is not None or sort in ('rating', '-rating'):
+        query = query.options(with_expression(models.Item.rating, RATING_KEY))
+    limit = pagination.clamp_limit(limit)
+    if sort == 'relevance':
+        keys, descending = [ranked.c.relevance, models.Item.item_id], True
+    elif sort in ('rating', '-rating'):
+        keys, descending = [RATING_KEY, models.Item.item_id], sort == '-rating'
+    else:
+        keys, descending = HOUSE_SORT_KEYS[sort]
+    if stream_format:
+        return export.stream(request, pagination.keyset(query, keys, cursor, None, descending), schemas.Item, stream_format, 'houses')
+    houses = await db.scalars(pagination.keyset(query, keys, cursor, limit, descending))
+    items, next_cursor = pagination.page(houses.all(), keys, limit)
+    page = {"items": items, "next_cursor": next_cursor, "facets": facet_counts}
+    return await response_cache.store(request, serializers.json_response(schemas.ItemSearchPage, page))
+
+async def search_facets(db: AsyncSession, request: Request, ids):
+    # cached apart from the page itself, so paging and re-sorting a search
+    # doesn't recount
+    response_cache = get_response_cache(request)
+    name = facets.cache_name(request)
+    cached = await response_cache.get(name)
+    if cached is not None:
+        return orjson.loads(cached)
+    counts = await facets.counts(db, ids)
+    await response_cache.set(name, orjson.dumps(counts))
+    return counts
+
+# one SELECT IN per collection, so a batch of any size costs a fixed
+# 1 + len(ITEM_DETAIL_OPTIONS) queries
+ITEM_DETAIL_OPTIONS = [
+    selectinload(models.Item.locations),
+    selectinload(models.Item.descriptions),
+    selectinload(models.Item.features),
+    selectinload(models.Item.rules),
+    selectinload(models.Item.open_close),
+    selectinload(models.Item.type_lists),
+    selectinload(models.Item.ratings),
+    selectinload(models.Item.comments),
+]
+
+@router.get("/houses/full", response_model=List[schemas.ItemFull])
+async def get_houses_full(ids: Annotated[List[int], Query(max_length=pagination.MAX_PAGE_SIZE)], request: Request, db: AsyncSession = Depends(get_read_db),
+                          response_cache: ResponseCache = Depends(get_response_cache)):
+    cached = await response_cache.lookup(request)
+    if cached:
+        return cached
+    houses = await db.scalars(select(models.Item).where(models.Item.item_id.in_(ids)).options(*ITEM_DETAIL_OPTIONS).order_by(models.Item.item_id))
+    return await response_cache.store(request, serializers.json_response(List[schemas.ItemFull], houses.all()))
+
+@router.get("/houses/{item_id}/full", response_model=schemas.ItemFull)
+async def get_house_full(item_id: int, request: Request, db: AsyncSession = Depends(get_read_db),
+                         response_cache: ResponseCache = Depends(get_response_cache)):
+    cached = await response_cache.lookup(request)
+    if cached:
+        return cached
+    house = await db.scalar(select(models.Item).where(models.Item.item_id == item_id).options(*ITEM_DETAIL_OPTIONS))
+    if house is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    return await response_cache.store(request, serializers.json_response(schemas.ItemFull, house))
+
+@router.get("/houses/{item_id}/rating", response_model=schemas.ItemRatingSummary)
+async def get_house_rating(item_id: int, request: Request, db: AsyncSession = Depends(get_read_db),
+                           response_cache: ResponseCache = Depends(get_response_cache)):
+    cached = await response_cache.lookup(request)
+    if cached:
+        return cached
+    summary = await ratings.summary(db, item_id)
+    return await response_cache.store(request, serializers.json_response(schemas.ItemRatingSummary, summary))
+
+@router.post("/ratings", response_model=schemas.Rating)
+async def create_rating(rating: schemas.RatingCreate, db: Annotated[AsyncSession, Depends(get_async_db)],
+                        current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                        response_cache: Annotated[ResponseCache, Depends(get_response_cache)]):
+    try:
+        db_rating = await ratings.add_rating(db, {**rating.model_dump(exclude={'rates'}), "user_id": current_user.user_id},
+                                             [rate.model_dump() for rate in rating.rates])
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid item")
+    await response_cache.invalidate()
+    return db_rating
+
+@router.delete("/ratings/{rating_id}", response_model=schemas.Rating)
+async def delete_rating(rating_id: int, db: Annotated[AsyncSession, Depends(get_async_db)],
+                        current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                        response_cache: Annotated[ResponseCache, Depends(get_response_cache)]):
+    rating = await db.get(models.Rating, rating_id)
+    if rating is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rating not found")
+    if rating.user_id != current_user.user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to take action")
+    deleted = await ratings.remove_rating(db, rating_id)
+    await db.commit()
+    await response_cache.invalidate()
+    return deleted
+
+@router.post("/admin/ratings/rebuild", dependencies=[Depends(auth.require_admin)])
+async def rebuild_ratings(db: Annotated[AsyncSession, Depends(get_async_db)], response_cache: Annotated[ResponseCache, Depends(get_response_cache)]):
+    rebuilt = await ratings.rebuild(db)
+    await db.commit()
+    await response_cache.invalidate()
+    return {"items": rebuilt}
+
+@router.get("/houses/available", response_model=schemas.ItemPage)
+async def available_houses(entry: date, exit: date, guests: int = 1, cursor: Optional[str] = None,
+                           limit: int = pagination.DEFAULT_PAGE_SIZE, db: AsyncSession = Depends(get_read_db)):
+    if exit <= entry:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="exit must be after entry")
+    query = await availability.available(db, select(models.Item), entry, exit, guests)
+    limit = pagination.clamp_limit(limit)
+    keys = [models.Item.item_id]
+    houses = await db.scalars(pagination.keyset(query, keys, cursor, limit))
+    items, next_cursor = pagination.page(houses.all(), keys, limit)
+    return serializers.json_response(schemas.ItemPage, {"items": items, "next_cursor": next_cursor})
+
+@router.get("/houses/near", response_model=schemas.ItemNearPage)
+async def houses_near(lat: Annotated[float, Query(ge=-90, le=90)], lon: Annotated[float, Query(ge=-180, le=180)],
+                      radius: Annotated[float, Query(gt=0, le=geo.MAX_RADIUS_KM)] = 5.0, min_price: Optional[float] = None,
+                      max_price: Optional[float] = None, cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                      db: AsyncSession = Depends(get_read_db)):
+    """Houses with a location within `radius` km of (lat, lon), nearest
+    first. The geohash index narrows the candidates to a few cells; exact
+    distances are then computed here."""
+    query = (
+        select(models.Location.item_id, models.Location.latitude, models.Location.longitude)
+        .join(models.Item, models.Item.item_id == models.Location.item_id)
+        .where(geo.in_cells(models.Location.geohash, geo.covering_cells(lat, lon, radius)))
+    )
+    if min_price is not None:
+        query = query.where(models.Item.price >= min_price)
+    if max_price is not None:
+        query = query.where(models.Item.price <= max_price)
+    distances = {}
+    for item_id, latitude, longitude in await db.execute(query):
+        distance = geo.distance_km(lat, lon, latitude, longitude)
+        if distance <= radius and distance < distances.get(item_id, radius + 1):
+            distances[item_id] = distance
+    nearest = sorted((distance, item_id) for item_id, distance in distances.items())
+    if cursor:
+        after = tuple(pagination.decode_cursor(cursor, [NEAR_DISTANCE, models.Item.item_id]))
+        nearest = [key for key in nearest if key > after]
+    limit = pagination.clamp_limit(limit)
+    next_cursor = pagination.encode_cursor(nearest[limit - 1]) if len(nearest) > limit else None
+    nearest = nearest[:limit]
+    houses = {}
+    if nearest:
+        houses = {house.item_id: house for house in await db.scalars(
+            select(models.Item).where(models.Item.item_id.in_([item_id for _, item_id in nearest])))}
+    items = [dict(schemas.Item.model_validate(houses[item_id]).model_dump(), distance_km=round(distance, 3))
+             for distance, item_id in nearest]
+    return serializers.json_response(schemas.ItemNearPage, {"items": items, "next_cursor": next_cursor})
+
+@router.post("/reservations", response_model=schemas.Reservation)
+async def create_reservation(reservation: schemas.ReservationCreate, db: Annotated[AsyncSession, Depends(get_async_db)]):
+    if reservation.exit_date <= reservation.entry_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="exit_date must be after entry_date")
+    try:
+        db_reservation = await availability.book(db, reservation.model_dump())
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # a concurrent booking won the race (exclusion constraint), or a bad FK
+        if 'reservations_no_overlap' not in str(e.orig):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid renter or item")
+        db_reservation = None
+    if db_reservation is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Item is already booked for these dates")
+    return db_reservation
+
+@router.get("/users/{user_id}/travels", response_model=List[schemas.Reservation])
+async def get_travels(user_id: int, request: Request, format: Optional[Literal['json', 'ndjson', 'csv']] = None, db: AsyncSession =Depends(get_read_db)):
+    # approved stays with a paid invoice
+    query = (
+        select(models.Reservation).distinct()
+        .join(models.Application, models.Application.res_id == models.Reservation.res_id)
+        .join(models.Invoice, models.Invoice.app_id == models.Application.app_id)
+        .where(models.Reservation.renter_id == user_id, models.Application.status == 'approved', models.Invoice.status == 'paid')
+        .order_by(models.Reservation.res_id)
+    )
+    stream_format = export.export_format(request, format)
+    if stream_format:
+        return export.stream(request, query, schemas.Reservation, stream_format, 'travels')
+    travels = await db.scalars(query)
+    return serializers.json_response(List[schemas.Reservation], travels.all())
+
+@router.get("/reports/host/{host_id}", response_model=schemas.HostReport)
+async def get_host_report(host_id: int, db: Annotated[AsyncSession, Depends(get_read_db)],
+                          current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                          since: Optional[date] = None, until: Optional[date] = None):
+    """Monthly invoiced, paid and pending revenue of the host's houses."""
+    if current_user.user_id != host_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Reports are only available to the host")
+    return serializers.json_response(schemas.HostReport, await reports.host_revenue(db, host_id, since, until))
+
+@router.get("/reports/host/{host_id}/occupancy", response_model=List[schemas.ItemOccupancy])
+async def get_host_occupancy(host_id: int, db: Annotated[AsyncSession, Depends(get_read_db)],
+                             current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                             since: Optional[date] = None, until: Optional[date] = None):
+    if current_user.user_id != host_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Reports are only available to the host")
+    return serializers.json_response(List[schemas.ItemOccupancy], await reports.host_occupancy(db, host_id, since, until))
+
+@router.post("/admin/reports/refresh", dependencies=[Depends(auth.require_admin)])
+async def refresh_reports(db: Annotated[AsyncSession, Depends(get_async_db)], full: bool = False):
+    written = await reports.refresh(db, full=full)
+    if written is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A refresh is already running")
+    await db.commit()
+    return {"rows": written}
+
+@router.get('/messages/{host_id}/{sender}', response_model=List[schemas.Message])
+async def get_messages_of_specific_user(host_id: int, sender: int, db: AsyncSession =Depends(get_read_db)):
+    query = await db.scalars(select(models.Message).join(models.Item, models.Item.item_id == models.Message.item_id)
+                             .where(models.Message.receiver_id == host_id , models.Message.sender_id == sender , models.Item.owner_id == host_id))
+    return serializers.json_response(List[schemas.Message], query.all())
+
+@router.get('/all-messages/{host_id}', response_model=List[schemas.Message])
+async def get_all_messages(host_id: int, request: Request, format: Optional[Literal['json', 'ndjson', 'csv']] = None, db: AsyncSession =Depends(get_read_db)):
+    query = select(models.Message).join(models.Item, models.Item.item_id == models.Message.item_id).where(
+        models.Message.receiver_id == host_id, models.Item.owner_id == host_id)
+    stream_format = export.export_format(request, format)
+    if stream_format:
+        return export.stream(request, query, schemas.Message, stream_format, 'messages')
+    messages = await db.scalars(query)
+    return serializers.json_response(List[schemas.Message], messages.all())
+
+@router.get('/inbox', response_model=schemas.ConversationPage)
+async def get_inbox(db: Annotated[AsyncSession, Depends(get_read_db)], current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                    cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE):
+    query = inbox.conversations(current_user.user_id)
+    limit = pagination.clamp_limit(limit)
+    keys = [query.selected_columns.last_message_id]
+    rows = await db.execute(pagination.keyset(query, keys, cursor, limit, descending=True))
+    rows, next_cursor = pagination.page(rows.all(), keys, limit)
+    items = [{"counterpart_id": row.counterpart_id, "item_id": row.item_id, "message_count": row.message_count, "last_message": row.Message}
+             for row in rows]
+    return serializers.json_response(schemas.ConversationPage, {"items": items, "next_cursor": next_cursor})
+
+@router.get('/inbox/{counterpart_id}/{item_id}', response_model=schemas.MessagePage)
+async def get_conversation(counterpart_id: int, item_id: int, db: Annotated[AsyncSession, Depends(get_read_db)],
+                           current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                           cursor: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE):
+    # newest first; the cursor walks back through older messages
+    limit = pagination.clamp_limit(limit)
+    keys = [models.Message.message_id]
+    query = inbox.thread(current_user.user_id, counterpart_id, item_id)
+    messages = await db.scalars(pagination.keyset(query, keys, cursor, limit, descending=True))
+    items, next_cursor = pagination.page(messages.all(), keys, limit)
+    return serializers.json_response(schemas.MessagePage, {"items": items, "next_cursor": next_cursor})
+
+@router.post('/messages', response_model=schemas.Message)
+async def send_message(message: schemas.MessageCreate, db: Annotated[AsyncSession, Depends(get_async_db)],
+                       current_user: Annotated[schemas.UserModel, Depends(auth.get_current_user)],
+                       broker: Annotated[LocalBroker, Depends(get_broker)]):
+    db_message = models.Message(sender_id=current_user.user_id, **message.model_dump())
+    db.add(db_message)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid receiver or item")
+    payload = schemas.Message.model_validate(db_message).model_dump(mode='json')
+    await broker.publish(db, payload)
+    return payload
+
+@router.websocket('/ws/messages')
+async def message_socket(websocket: WebSocket, token: str, db: Annotated[AsyncSession, Depends(get_async_db)],
+                         broker: Annotated[LocalBroker, Depends(get_broker)]):
+    try:
+        user = await auth.get_current_user(db, websocket, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        # don't hold a pooled connection for the life of the socket
+        await db.close()
+    await websocket.accept()
+    async with broker.subscribe(user.user_id) as queue:
+        await relay(websocket, queue)
+
+
+@router.post("/create-house", response_model=schemas.Item)
+async def create_house(item: schemas.ItemCreate, db: Annotated[AsyncSession, Depends(get_async_db)],
+                       response_cache: Annotated[ResponseCache, Depends(get_response_cache)]):
+    try:
+        db_item = await upsert.insert_new(db, models.Item, item.model_dump(), [models.Item.name, models.Item.about])
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid owner")
+    if db_item is None:
+        raise HTTPException(status_code=403, detail='Item already exists')
+    await search.index_item(db, db_item)
+    await db.commit()
+    await response_cache.invalidate()
+    return db_item
+
+@router.patch("/houses/prices", response_model=schemas.BulkUpdateResult, dependencies=[Depends(auth.require_admin)])
+async def update_prices(prices: List[schemas.ItemPrice], db: Annotated[AsyncSession, Depends(get_async_db)],
+                        response_cache: Annotated[ResponseCache, Depends(get_response_cache)]):
+    updated, missing = await updates.update_many(db, models.Item, [price.model_dump() for price in prices])
+    await db.commit()
+    if updated:
+        await response_cache.invalidate()
+    return {"updated": updated, "missing": missing}
+
+@router.post("/favorites/add", response_model=schemas.Like)
+async def add_to_favorites(like: schemas.Like, db: Annotated[AsyncSession, Depends(get_async_db)]):
+    try:
+        db_like = await upsert.insert_new(db, models.Like, like.model_dump(), [models.Like.user_id, models.Like.item_id])
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user or item")
+    if db_like is None:
+        raise HTTPException(status_code=403, detail='this item is already favorited')
+    await db.commit()
+    return db_like
+
+@router.post("/favorites/bulk-add", response_model=List[schemas.Like])
+async def add_many_to_favorites(favorites: schemas.FavoritesBulk, db: Annotated[AsyncSession, Depends(get_async_db)]):
+    """Favorites several items in one statement; returns the ones that
+    weren't favorited already."""
+    rows = [{"user_id": favorites.user_id, "item_id": item_id} for item_id in dict.fromkeys(favorites.item_ids)]
+    try:
+        added = await upsert.insert_new_many(db, models.Like, rows, [models.Like.user_id, models.Like.item_id])
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user or item")
+    return added
+
+@router.post("/favorites/bulk-remove", response_model=List[schemas.Like])
+async def remove_many_from_favorites(favorites: schemas.FavoritesBulk, db: Annotated[AsyncSession, Depends(get_async_db)]):
+    """Unfavorites several items in one statement; returns the ones that
+    were removed."""
+    removed = await db.scalars(
+        delete(models.Like)
+        .where(models.Like.user_id == favorites.user_id, models.Like.item_id.in_(favorites.item_ids))
+        .returning(models.Like)
+    )
+    removed = removed.all()
+    await db.commit()
+    return removed
+
+# response types whose serializers are built at startup rather than on the
+# first request that needs them
+WARM_RESPONSE_TYPES = [
+    schemas.UserPage, schemas.ItemSearchPage, schemas.ItemPage, schemas.ItemNearPage, schemas.ItemFull,
+    List[schemas.ItemFull], schemas.ItemRatingSummary, List[schemas.Reservation], schemas.ConversationPage,
+    schemas.MessagePage, List[schemas.Message],
+]
+
+
+async def warm_statements(db: AsyncSession):
+    """Runs the statements of the hottest read paths once, so they are
+    compiled, eager loads included, before the first request needs them."""
+    first_item = await db.scalar(select(func.min(models.Item.item_id))) or 0
+    first_user = await db.scalar(select(func.min(models.USER.user_id))) or 0
+    limit = pagination.DEFAULT_PAGE_SIZE
+    statements = [
+        pagination.keyset(select(models.USER), [models.USER.user_id], None, limit),
+        select(models.USER).where(models.USER.user_id == first_user),
+        select(models.USER).where(models.USER.email == ''),
+        pagination.keyset(select(models.Item), HOUSE_SORT_KEYS['item_id'][0], None, limit),
+        select(models.Item).where(models.Item.item_id == first_item).options(*ITEM_DETAIL_OPTIONS),
+        select(models.Item).where(models.Item.item_id.in_([first_item])).options(*ITEM_DETAIL_OPTIONS).order_by(models.Item.item_id),
+    ]
+    for statement in statements:
+        (await db.scalars(statement)).all()
+
+
+def build_openapi(app: FastAPI) -> dict:
     if app.openapi_schema:
         return app.openapi_schema
     openapi_schema = get_openapi(
@@ -148,67 +616,53 @@ def custom_openapi():
     app.openapi_schema = openapi_schema
     return app.openapi_schema
 
-app.openapi = custom_openapi
 
+def create_app(app_settings: Settings = settings) -> FastAPI:
+    """The application, with its settings and a database, message broker
+    and caches of its own configured from them, kept on app.state, where
+    the dependencies find them. Engines are created on first use; startup then
+    opens DB_POOL_PREWARM connections, runs the hot statements on each and
+    builds the response serializers and the OpenAPI schema, so the first
+    requests run as fast as later ones. The time that took is logged and
+    reported by /health/db."""
+    db = database.Database(app_settings)
+    app_broker = make_broker(app_settings)
+    user_cache = auth.UserCache(app_settings.auth_cache_size, app_settings.auth_cache_ttl)
+    app_broker.on_users_changed(user_cache.forget)
 
-@app.get("/houses/", response_model=List[schemas.Item])
-def search_houses(name: Optional[str] = None, state: Optional[str] = None, city: Optional[str] = None,
-                  min_price: Optional[float] = None, max_price: Optional[float] = None, db: Session = Depends(get_db)):
-    query = db.query(models.Item)
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        start = time.perf_counter()
+        connections = await db.prewarm(app_settings.pool_prewarm, warm_statements)
+        for response_type in WARM_RESPONSE_TYPES:
+            serializers.adapter(response_type)
+        app.openapi()
+        app.state.startup = {"seconds": round(time.perf_counter() - start, 3), "connections": connections}
+        logger.info('started in %.3f s with %d warm connections', app.state.startup["seconds"], connections)
+        try:
+            # listen from the start, so other workers' user changes arrive
+            await app_broker.start()
+        except Exception:
+            logger.exception('message broker unavailable')
+        db.read_router.start()
+        refresher = reports.Refresher(db.async_session_factory, app_settings.report_refresh_interval,
+                                      app_settings.report_full_refresh_interval)
+        refresher.start()
+        yield
+        await refresher.stop()
+        await app_broker.stop()
+        await db.dispose()
 
-    if name:
-        query = query.filter(models.Item.name.contains(name))
-    if state or city:
-        query = query.join(models.Location)
-        if state:
-            query = query.filter(models.Location.state.contains(state))
-        if city:
-            query = query.filter(models.Location.city.contains(city))
-    if min_price is not None:
-        query = query.filter(models.Item.price >= min_price)
-    if max_price is not None:
-        query = query.filter(models.Item.price <= max_price)
-    houses = query.all()
-    return houses
-
-@app.get("/users/{user_id}/travels", response_model=List[schemas.Reservation])
-def get_travels(user_id: int, db: Session =Depends(get_db)):
-    query = db.query(models.Reservation).filter(
-        models.Reservation.renter_id == user_id ,
-         models.Application.res_id == models.Reservation.res_id,
-         models.Invoice.app_id == models.Application.app_id,
-         models.Invoice.status == 'paid' and models.Application.status == 'approved'
-    ).all()
-    return query
-
-@app.get('/messages/{host_id}/{sender}', response_model=List[schemas.Message])
-def get_messages_of_specific_user(host_id: int, sender: int, db: Session =Depends(get_db)):
-    query = db.query(models.Message).filter(models.Message.receiver_id == host_id , models.Message.sender_id == sender , models.Message.receiver_id == models.Item.owner_id).all()
-    return query
-
-@app.get('/all-messages/{host_id}', response_model=List[schemas.Message])
-def get_all_messages(host_id: int, db: Session =Depends(get_db)):
-    query = db.query(models.Message).filter(models.Message.receiver_id == host_id, models.Message.receiver_id == models.Item.owner_id).all()
-    return query
-
-
-@app.post("/create-house", response_model=schemas.Item)
-def create_house(item: schemas.ItemCreate, db: Annotated[Session, Depends(get_db)]):
-    if db.query(models.Item).filter(models.Item.name == item.name, models.Item.about == item.about).first():
-        raise HTTPException(status_code=403, detail='Item already exists')
-    db_item = models.Item(**item.dict())
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.state.settings = app_settings
+    app.state.database = db
+    app.state.broker = app_broker
+    app.state.user_cache = user_cache
+    app.state.response_cache = make_cache(app_settings)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_middleware(ReadYourWritesMiddleware)
+    app.include_router(router)
+    app.openapi = lambda: build_openapi(app)
+    return app
 
-@app.post("/favorites/add", response_model=schemas.Like)
-def add_to_favorites(like: schemas.Like, db: Annotated[Session, Depends(get_db)]):
-    query = db.query(models.Like).filter(models.Like.user_id == like.user_id, models.Like.item_id == like.item_id).first()
-    if query:
-        raise HTTPException(status_code=403, detail='this item is already favorited')
-    db_like = models.Like(**like.dict())
-    db.add(db_like)
-    db.commit()
-    db.refresh(db_like)
-    return db_like
\ No newline at end of file
+app = create_app()
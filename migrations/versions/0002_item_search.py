@@ -0,0 +1,56 @@
+"""item search documents
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 18:10:02.114523
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    if is_postgres:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_table('item_search',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('document', sa.TEXT(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.item_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id')
+    )
+    if is_postgres:
+        op.create_index('ix_item_search_tsv', 'item_search', [sa.text("to_tsvector('simple', document)")], unique=False, postgresql_using='gin')
+        op.create_index('ix_item_search_trgm', 'item_search', ['document'], unique=False, postgresql_using='gin', postgresql_ops={'document': 'gin_trgm_ops'})
+        # backfill documents for items that existed before the search table
+        op.execute("""
+            INSERT INTO item_search (item_id, document)
+            SELECT i.item_id,
+                   concat_ws(' ', i.name, i.about, string_agg(concat_ws(' ', l.state, l.city), ' '))
+            FROM items i LEFT JOIN location l ON l.item_id = i.item_id
+            GROUP BY i.item_id, i.name, i.about
+        """)
+    else:
+        op.execute("""
+            INSERT INTO item_search (item_id, document)
+            SELECT i.item_id,
+                   trim(i.name || ' ' || coalesce(i.about, '') || ' ' || coalesce(group_concat(l.state || ' ' || l.city, ' '), ''))
+            FROM items i LEFT JOIN location l ON l.item_id = i.item_id
+            GROUP BY i.item_id, i.name, i.about
+        """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_item_search_trgm', table_name='item_search')
+        op.drop_index('ix_item_search_tsv', table_name='item_search')
+    op.drop_table('item_search')
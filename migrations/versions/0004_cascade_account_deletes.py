@@ -0,0 +1,61 @@
+"""cascade deletes from items and the reservation chain
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 18:31:40.527190
+
+Deleting a user now removes everything that hangs off it in one DELETE:
+users already cascade to their rows, this makes items, reservations,
+applications, invoices and payments cascade too.
+
+SQLite can't alter foreign keys in place; SQLite databases are created from
+the models (which carry the cascades) so only Postgres is migrated here.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referenced table, referenced column)
+FOREIGN_KEYS = [
+    ('type', 'item_id', 'items', 'item_id'),
+    ('location', 'item_id', 'items', 'item_id'),
+    ('features', 'item_id', 'items', 'item_id'),
+    ('open_close', 'item_id', 'items', 'item_id'),
+    ('rules', 'item_id', 'items', 'item_id'),
+    ('ratings', 'item_id', 'items', 'item_id'),
+    ('rates', 'item_id', 'items', 'item_id'),
+    ('properties', 'item_id', 'items', 'item_id'),
+    ('item_description', 'item_id', 'items', 'item_id'),
+    ('messages', 'item_id', 'items', 'item_id'),
+    ('likes', 'item_id', 'items', 'item_id'),
+    ('comment_section', 'item_id', 'items', 'item_id'),
+    ('reservations', 'item_id', 'items', 'item_id'),
+    ('applications', 'res_id', 'reservations', 'res_id'),
+    ('invoice', 'app_id', 'applications', 'app_id'),
+    ('payment', 'invoice_id', 'invoice', 'invoice_id'),
+    ('invoice_line', 'payment_id', 'payment', 'payment_id'),
+]
+
+
+def _recreate(ondelete: Union[str, None]) -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column, referent, remote_column in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], [remote_column], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    _recreate('CASCADE')
+
+
+def downgrade() -> None:
+    _recreate(None)
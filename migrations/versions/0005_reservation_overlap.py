@@ -0,0 +1,36 @@
+"""reservation date index and overlap exclusion
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 19:02:13.640811
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_reservations_item_id', table_name='reservations')
+    op.create_index('ix_reservations_item_id_dates', 'reservations', ['item_id', 'entry_date', 'exit_date'], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        # fails if overlapping reservations already exist; resolve those first
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute(
+            'ALTER TABLE reservations ADD CONSTRAINT reservations_no_overlap '
+            'EXCLUDE USING gist (item_id WITH =, daterange(entry_date, exit_date) WITH &&)'
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('reservations_no_overlap', 'reservations')
+    op.drop_index('ix_reservations_item_id_dates', table_name='reservations')
+    op.create_index('ix_reservations_item_id', 'reservations', ['item_id'], unique=False)
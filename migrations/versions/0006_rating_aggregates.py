@@ -0,0 +1,55 @@
+"""item rating aggregates
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 19:41:37.208155
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('item_ratings',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('rating_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('rating', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['item_id'], ['items.item_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id')
+    )
+    op.create_index(op.f('ix_item_ratings_rating'), 'item_ratings', ['rating'], unique=False)
+    op.create_table('item_rate_totals',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('rate_title', sa.String(length=255), nullable=False),
+    sa.Column('rate_count', sa.Integer(), nullable=False),
+    sa.Column('rate_sum', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.item_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id', 'rate_title')
+    )
+    # backfill from the existing ratings (same statements as sql.ratings.rebuild)
+    op.execute("""
+        INSERT INTO item_ratings (item_id, rating_count, rating_sum, rating)
+        SELECT item_id, count(*), sum(total_rate), CAST(sum(total_rate) AS FLOAT) / count(*)
+        FROM ratings GROUP BY item_id
+    """)
+    op.execute("""
+        INSERT INTO item_rate_totals (item_id, rate_title, rate_count, rate_sum)
+        SELECT item_id, rate_title, count(*), sum(rate)
+        FROM rates GROUP BY item_id, rate_title
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('item_rate_totals')
+    op.drop_index(op.f('ix_item_ratings_rating'), table_name='item_ratings')
+    op.drop_table('item_ratings')
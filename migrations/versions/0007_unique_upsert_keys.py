@@ -0,0 +1,54 @@
+"""unique keys behind the insert-if-absent writes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 20:52:14.730981
+
+Registration, create-house and favorites insert with ON CONFLICT DO NOTHING
+against these instead of checking for a duplicate first. Duplicate likes
+are dropped (keeping the oldest); duplicate phones or houses have to be
+resolved by hand, so the upgrade stops if there are any.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DUPLICATES = {
+    'users (phone)': 'SELECT count(*) FROM (SELECT phone FROM users WHERE phone IS NOT NULL GROUP BY phone HAVING count(*) > 1) AS d',
+    'items (name, about)': 'SELECT count(*) FROM (SELECT name, about FROM items GROUP BY name, about HAVING count(*) > 1) AS d',
+}
+
+
+def upgrade() -> None:
+    # with --sql there is no database to count in; the unique indexes below
+    # still refuse duplicates when the script runs, just less helpfully
+    if not context.is_offline_mode():
+        bind = op.get_bind()
+        for table, query in DUPLICATES.items():
+            count = bind.execute(sa.text(query)).scalar()
+            if count:
+                raise RuntimeError(f'{count} duplicate key(s) in {table}; resolve them before upgrading')
+    op.execute("""
+        DELETE FROM likes WHERE like_id NOT IN (SELECT min(like_id) FROM likes GROUP BY user_id, item_id)
+    """)
+    op.drop_index('ix_users_phone', table_name='users')
+    op.create_index(op.f('ix_users_phone'), 'users', ['phone'], unique=True)
+    op.create_index('ix_items_name_about', 'items', ['name', 'about'], unique=True)
+    op.drop_index('ix_likes_user_id_item_id', table_name='likes')
+    op.create_index('ix_likes_user_id_item_id', 'likes', ['user_id', 'item_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_likes_user_id_item_id', table_name='likes')
+    op.create_index('ix_likes_user_id_item_id', 'likes', ['user_id', 'item_id'], unique=False)
+    op.drop_index('ix_items_name_about', table_name='items')
+    op.drop_index(op.f('ix_users_phone'), table_name='users')
+    op.create_index(op.f('ix_users_phone'), 'users', ['phone'], unique=False)
@@ -0,0 +1,35 @@
+"""location coordinates and geohash index
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 21:37:05.118402
+
+Existing locations have no coordinates, so their geohash stays NULL and
+they don't show up in proximity searches until coordinates are added.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('location', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('location', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('location', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_location_geohash'), 'location', ['geohash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_location_geohash'), table_name='location')
+    with op.batch_alter_table('location') as batch_op:
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
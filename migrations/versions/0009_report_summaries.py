@@ -0,0 +1,57 @@
+"""host revenue and occupancy summaries
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 22:26:48.604117
+
+The tables start empty; the first refresh (REPORT_REFRESH_INTERVAL, or
+POST /admin/reports/refresh) fills them from the existing invoices and
+reservations.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('host_revenue',
+    sa.Column('host_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('invoices', sa.Integer(), nullable=False),
+    sa.Column('paid_invoices', sa.Integer(), nullable=False),
+    sa.Column('invoiced_amount', sa.DECIMAL(precision=14, scale=2), nullable=False),
+    sa.Column('paid_amount', sa.DECIMAL(precision=14, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['host_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('host_id', 'month')
+    )
+    op.create_table('item_occupancy',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('host_id', sa.Integer(), nullable=False),
+    sa.Column('booked_nights', sa.Integer(), nullable=False),
+    sa.Column('reservations', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['host_id'], ['users.user_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['item_id'], ['items.item_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id', 'month')
+    )
+    op.create_index('ix_item_occupancy_host_id_month', 'item_occupancy', ['host_id', 'month'], unique=False)
+    op.create_table('report_watermarks',
+    sa.Column('source', sa.String(length=50), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('report_watermarks')
+    op.drop_index('ix_item_occupancy_host_id_month', table_name='item_occupancy')
+    op.drop_table('item_occupancy')
+    op.drop_table('host_revenue')
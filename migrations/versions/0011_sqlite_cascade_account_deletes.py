@@ -0,0 +1,74 @@
+"""cascade deletes from items and the reservation chain, on SQLite
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 19:20:11.402871
+
+0004 added these cascades on Postgres only; a SQLite database upgraded
+through it kept foreign keys that block deleting an account. SQLite can't
+alter foreign keys in place, so each table still missing its cascade is
+rebuilt through batch mode; its foreign keys are unnamed and are matched
+through a naming convention. Postgres is left as 0004 made it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referenced table, referenced column), as in 0004
+FOREIGN_KEYS = [
+    ('type', 'item_id', 'items', 'item_id'),
+    ('location', 'item_id', 'items', 'item_id'),
+    ('features', 'item_id', 'items', 'item_id'),
+    ('open_close', 'item_id', 'items', 'item_id'),
+    ('rules', 'item_id', 'items', 'item_id'),
+    ('ratings', 'item_id', 'items', 'item_id'),
+    ('rates', 'item_id', 'items', 'item_id'),
+    ('properties', 'item_id', 'items', 'item_id'),
+    ('item_description', 'item_id', 'items', 'item_id'),
+    ('messages', 'item_id', 'items', 'item_id'),
+    ('likes', 'item_id', 'items', 'item_id'),
+    ('comment_section', 'item_id', 'items', 'item_id'),
+    ('reservations', 'item_id', 'items', 'item_id'),
+    ('applications', 'res_id', 'reservations', 'res_id'),
+    ('invoice', 'app_id', 'applications', 'app_id'),
+    ('payment', 'invoice_id', 'invoice', 'invoice_id'),
+    ('invoice_line', 'payment_id', 'payment', 'payment_id'),
+]
+
+SQLITE_NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _ondelete(inspector, table: str, column: str) -> Union[str, None]:
+    for fk in inspector.get_foreign_keys(table):
+        if fk['constrained_columns'] == [column]:
+            return (fk.get('options') or {}).get('ondelete')
+    return None
+
+
+def _recreate(ondelete: Union[str, None]) -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    inspector = sa.inspect(op.get_bind())
+    for table, column, referent, remote_column in FOREIGN_KEYS:
+        if (_ondelete(inspector, table, column) or '').upper() == (ondelete or ''):
+            continue
+        name = f'fk_{table}_{column}_{referent}'
+        with op.batch_alter_table(table, naming_convention=SQLITE_NAMING) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referent, [column], [remote_column], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    _recreate('CASCADE')
+
+
+def downgrade() -> None:
+    _recreate(None)
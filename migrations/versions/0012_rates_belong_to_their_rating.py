@@ -0,0 +1,47 @@
+"""rates belong to their rating
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 19:02:47.285289
+
+Rates only carried the item and the rater, so deleting one of a user's
+ratings of an item also deleted the rates given with their other ratings
+of it. Each rate now points at its rating. Existing rates are matched up
+where the rater has a single rating of the item; the rest can't be told
+apart and are left NULL.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FOREIGN_KEY = 'fk_rates_rating_id_ratings'
+
+
+def upgrade() -> None:
+    # batch mode rebuilds the table on SQLite, which can't add a foreign key
+    with op.batch_alter_table('rates') as batch_op:
+        batch_op.add_column(sa.Column('rating_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_rates_rating_id', ['rating_id'], unique=False)
+        batch_op.create_foreign_key(FOREIGN_KEY, 'ratings', ['rating_id'], ['rating_id'], ondelete='CASCADE')
+    op.execute("""
+        UPDATE rates SET rating_id = (
+            SELECT ratings.rating_id FROM ratings
+            WHERE ratings.item_id = rates.item_id AND ratings.user_id = rates.user_id)
+        WHERE (SELECT count(*) FROM ratings
+               WHERE ratings.item_id = rates.item_id AND ratings.user_id = rates.user_id) = 1
+    """)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('rates') as batch_op:
+        batch_op.drop_constraint(FOREIGN_KEY, type_='foreignkey')
+        batch_op.drop_index('ix_rates_rating_id')
+        batch_op.drop_column('rating_id')
@@ -0,0 +1,33 @@
+"""report watermarks record when they were last rebuilt
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18 21:14:05.118342
+
+When the summaries were last rebuilt in full was kept as a unix time in
+the last_id of a made-up 'full' source. Each source's watermark now has a
+rebuilt_at timestamp instead. The 'full' row is dropped, so the first
+refresh after the upgrade does a full rebuild and sets it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('report_watermarks', sa.Column('rebuilt_at', sa.DateTime(), nullable=True))
+    op.execute("DELETE FROM report_watermarks WHERE source = 'full'")
+
+
+def downgrade() -> None:
+    # without a 'full' row the older code rebuilds everything on its first run
+    with op.batch_alter_table('report_watermarks') as batch_op:
+        batch_op.drop_column('rebuilt_at')
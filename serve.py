@@ -0,0 +1,55 @@
+"""Serves the API from several worker processes.
+
+    DATABASE_URL=postgresql://... python serve.py --workers 4 --port 8000
+    python serve.py --workers 4 --show-pool
+
+uvicorn's supervisor starts each worker as a new process that imports the
+app and creates its own engines, and restarts workers that die. Each
+worker's pool is sized so that all of them, plus DB_RESERVED_CONNECTIONS,
+fit in the server's max_connections (or DB_MAX_CONNECTIONS):
+DB_POOL_SIZE and DB_MAX_OVERFLOW become upper bounds, and the sizes
+reach the workers in those variables. --show-pool prints them and exits.
+
+Pre-fork servers that import the app before forking work too, e.g.
+
+    gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4 --preload
+
+since a forked child drops the pooled connections it inherits without
+closing them (see sql.database); set DB_POOL_SIZE and DB_MAX_OVERFLOW to
+what --show-pool prints for the same number of workers.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from sql.database import server_max_connections, worker_settings
+from sql.settings import settings
+
+
+def pool_environment(workers: int) -> dict:
+    max_connections = settings.db_max_connections or server_max_connections(settings.database_url)
+    sized = worker_settings(settings, workers, max_connections)
+    return {"DB_POOL_SIZE": str(sized.pool_size), "DB_MAX_OVERFLOW": str(sized.max_overflow),
+            "DB_POOL_PREWARM": str(sized.pool_prewarm)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=settings.workers)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--show-pool', action='store_true', help='print the per-worker pool settings and exit')
+    args = parser.parse_args()
+
+    environment = pool_environment(args.workers)
+    if args.show_pool:
+        print(' '.join(f'{name}={value}' for name, value in environment.items()))
+        return
+    # the workers are new processes that read their settings from here
+    os.environ.update(environment)
+    uvicorn.run('main:app', host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
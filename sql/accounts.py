@@ -0,0 +1,65 @@
+from typing import List, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import State
+
+from . import models, jobs, availability, ratings, reports, search
+
+
+async def purge_user(db: AsyncSession, state: State, user_id: int) -> Optional[models.USER]:
+    # every table referencing users / items cascades, so this one statement
+    # removes the account and everything hanging off it; the rating aggregates
+    # of other hosts' items it had rated, and the reports of hosts it stayed
+    # with, are recomputed in the same transaction, and its houses leave the
+    # fallback search index after it. `state` is the app's: its broker tells
+    # the other workers, and its caches drop the deleted user
+    rated = await ratings.items_rated_by(db, [user_id])
+    hosts = await reports.hosts_of_renters(db, [user_id])
+    houses = await search.owned_items(db, [user_id])
+    deleted = await db.scalar(
+        delete(models.USER).where(models.USER.user_id == user_id).returning(models.USER),
+        execution_options={"synchronize_session": False},
+    )
+    await ratings.rebuild(db, rated)
+    await reports.rebuild(db, hosts)
+    await state.broker.users_changed(db, [user_id])
+    await db.commit()
+    state.user_cache.invalidate_user(user_id)
+    search.unindex_items(db, houses)
+    availability.reset(db)
+    await state.response_cache.invalidate()
+    return deleted
+
+
+async def purge_users(db: AsyncSession, state: State, user_ids: List[int]) -> List[int]:
+    rated = await ratings.items_rated_by(db, user_ids)
+    hosts = await reports.hosts_of_renters(db, user_ids)
+    houses = await search.owned_items(db, user_ids)
+    result = await db.scalars(
+        delete(models.USER).where(models.USER.user_id.in_(user_ids)).returning(models.USER.user_id),
+        execution_options={"synchronize_session": False},
+    )
+    deleted = sorted(result.all())
+    await ratings.rebuild(db, rated)
+    await reports.rebuild(db, hosts)
+    await state.broker.users_changed(db, deleted)
+    await db.commit()
+    for user_id in deleted:
+        state.user_cache.invalidate_user(user_id)
+    search.unindex_items(db, houses)
+    availability.reset(db)
+    await state.response_cache.invalidate()
+    return deleted
+
+
+async def run_purge_job(state: State, job_id: str, user_ids: List[int]):
+    sessionmaker = state.database.async_session_factory
+    await jobs.update(sessionmaker, job_id, status="running")
+    try:
+        async with sessionmaker() as db:
+            deleted = await purge_users(db, state, user_ids)
+    except Exception as e:
+        await jobs.update(sessionmaker, job_id, status="failed", error=str(e))
+        return
+    await jobs.update(sessionmaker, job_id, status="done", result={"deleted": deleted})
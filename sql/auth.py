@@ -1,49 +1,142 @@
-
+import hmac
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Annotated
+from typing import Dict, List, Optional, Annotated, Set, Tuple
 from jose import JWTError, jwt
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Header, status
+from fastapi.requests import HTTPConnection
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas
-from .database import get_db
+from .database import get_async_db
 
-SECRET_KEY = "YOMAMAAHOE"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login-token")
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(data: dict, secret_key: str, expires_delta: Optional[timedelta] = None):
     if expires_delta is None:
         expires_delta = timedelta(minutes=15)
     to_encode = data.copy()
     to_encode.update({"exp": datetime.utcnow() + expires_delta})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str, credentials_exception):
+def decode_token(token: str, secret_key: str, credentials_exception) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+        payload = jwt.decode(token, secret_key, algorithms=[ALGORITHM])
     except JWTError:
         raise credentials_exception
-    return token_data
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def verify_token(token: str, secret_key: str, credentials_exception):
+    payload = decode_token(token, secret_key, credentials_exception)
+    return schemas.TokenData(email=payload["sub"])
+
+
+class UserCache:
+    """Bounded LRU of verified tokens and the user they resolve to.
+
+    An entry lives until the token's `exp` or `ttl` seconds, whichever comes
+    first. Users changed through other workers are dropped when the broker
+    relays it (on Postgres); otherwise the ttl bounds how stale they get."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, schemas.UserModel]]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+
+    def get(self, token: str) -> Optional[schemas.UserModel]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                self._pop(token)
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: schemas.UserModel, exp: Optional[float]):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._pop(token)
+            self._entries[token] = (expires_at, user)
+            self._tokens_by_user.setdefault(user.user_id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._pop(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
 
-def get_current_user(db: Annotated[Session, Depends(get_db)], token: str = Depends(oauth2_scheme)):
+    def forget(self, user_ids: Optional[List[int]]):
+        # the app's broker calls this with the users other workers changed, or
+        # None when it may have missed some
+        if user_ids is None:
+            self.clear()
+            return
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+
+    def _pop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[1].user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[1].user_id]
+
+
+def get_user_cache(connection: HTTPConnection) -> UserCache:
+    """The login cache of the app serving `connection`."""
+    return connection.app.state.user_cache
+
+
+async def get_current_user(db: Annotated[AsyncSession, Depends(get_async_db)], connection: HTTPConnection,
+                           token: str = Header(...)) -> schemas.UserModel:
+    state = connection.app.state
+    # while the broker is disconnected other workers' changes don't arrive,
+    # so the cache can't be trusted
+    cached = state.broker.listening
+    user = state.user_cache.get(token) if cached else None
+    if user is not None:
+        return user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"}
     )
-    try:
-        token_data = verify_token(token, credentials_exception)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.USER).filter(models.USER.email == token_data.email).first()
-    if user is None:
+    payload = decode_token(token, state.settings.secret_key, credentials_exception)
+    db_user = await db.scalar(select(models.USER).where(models.USER.email == payload["sub"]))
+    if db_user is None:
         raise credentials_exception
+    user = schemas.UserModel.model_validate(db_user)
+    if cached:
+        state.user_cache.put(token, user, payload.get("exp"))
     return user
+
+
+def require_admin(connection: HTTPConnection, admin_token: str = Header(...)):
+    expected = connection.app.state.settings.admin_token
+    if not expected or not hmac.compare_digest(admin_token, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to take action")
@@ -0,0 +1,165 @@
+import threading
+from datetime import date
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import select, insert, exists, func, literal, and_, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import owner
+from .search import is_postgres
+
+# pending additions are folded into the tree once there are this many
+REBUILD_THRESHOLD = 256
+
+
+class IntervalTree:
+    """Static centered interval tree over half-open [start, end) date ranges,
+    with a small unsorted tail for intervals added since the last build."""
+
+    def __init__(self, intervals: List[Tuple[date, date, int]] = ()):
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[date, date, int]] = []
+        self._root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        points = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = points[len(points) // 2]
+        left, right, here = [], [], []
+        for interval in intervals:
+            if interval[1] <= center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        if not here and (not left or not right):
+            # all intervals on one side of the median; keep them at this node
+            here, left, right = left + right, [], []
+        return (
+            center,
+            sorted(here, key=lambda i: i[0]),
+            sorted(here, key=lambda i: i[1], reverse=True),
+            self._build(left),
+            self._build(right),
+        )
+
+    def add(self, start: date, end: date, item_id: int):
+        with self._lock:
+            self._pending.append((start, end, item_id))
+            if len(self._pending) >= REBUILD_THRESHOLD:
+                intervals = self._all(self._root) + self._pending
+                self._root = self._build(intervals)
+                self._pending = []
+
+    def _all(self, node) -> list:
+        if node is None:
+            return []
+        return node[1] + self._all(node[3]) + self._all(node[4])
+
+    def overlapping(self, start: date, end: date) -> Set[int]:
+        """Ids of items with an interval overlapping [start, end)."""
+        found = set()
+        with self._lock:
+            stack = [self._root]
+            while stack:
+                node = stack.pop()
+                if node is None:
+                    continue
+                center, by_start, by_end, left, right = node
+                if end <= center:
+                    for s, e, item_id in by_start:
+                        if s >= end:
+                            break
+                        if e > start:
+                            found.add(item_id)
+                    stack.append(left)
+                elif start > center:
+                    for s, e, item_id in by_end:
+                        if e <= start:
+                            break
+                        if s < end:
+                            found.add(item_id)
+                    stack.append(right)
+                else:
+                    # the query spans the center: overlaps every interval here
+                    # that isn't entirely on one side of it
+                    for s, e, item_id in by_start:
+                        if s < end and e > start:
+                            found.add(item_id)
+                    stack.extend([left, right])
+            for s, e, item_id in self._pending:
+                if s < end and e > start:
+                    found.add(item_id)
+        return found
+
+
+async def _fallback_tree(db: AsyncSession) -> IntervalTree:
+    # one per Database, built on first use
+    database = owner(db)
+    if database.reservation_tree is None:
+        rows = await db.execute(select(models.Reservation.entry_date, models.Reservation.exit_date, models.Reservation.item_id))
+        database.reservation_tree = IntervalTree(list(rows))
+    return database.reservation_tree
+
+
+def reset(db: AsyncSession):
+    # deletes (account purges) can't be applied to the tree of the Database
+    # `db` belongs to; it is rebuilt on next use
+    owner(db).reservation_tree = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _add_booked(session):
+    # bookings reach the tree once they are committed
+    booked = session.info.pop('booked', None)
+    tree = owner(session).reservation_tree
+    if booked and tree is not None:
+        for interval in booked:
+            tree.add(*interval)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_booked(session):
+    session.info.pop('booked', None)
+
+
+def overlap_condition(item_id, entry: date, exit: date, postgres: bool):
+    if postgres:
+        # matches the reservations_no_overlap GiST index
+        stay = func.daterange(models.Reservation.entry_date, models.Reservation.exit_date)
+        return and_(models.Reservation.item_id == item_id, stay.op('&&')(func.daterange(entry, exit)))
+    return and_(models.Reservation.item_id == item_id,
+                models.Reservation.entry_date < exit, models.Reservation.exit_date > entry)
+
+
+async def available(db: AsyncSession, query, entry: date, exit: date, guests: int):
+    """Narrows an Item select to houses that fit `guests` and are free for
+    [entry, exit)."""
+    query = query.where(exists().where(
+        models.ItemDescription.item_id == models.Item.item_id, models.ItemDescription.capacity >= guests))
+    if is_postgres(db):
+        return query.where(~exists().where(overlap_condition(models.Item.item_id, entry, exit, True)))
+    booked = (await _fallback_tree(db)).overlapping(entry, exit)
+    return query.where(models.Item.item_id.not_in(booked)) if booked else query
+
+
+async def book(db: AsyncSession, reservation: dict) -> Optional[models.Reservation]:
+    """Inserts the reservation unless it overlaps an existing one for the same
+    item, in a single INSERT ... SELECT ... WHERE NOT EXISTS. On Postgres the
+    reservations_no_overlap exclusion constraint also covers concurrent
+    bookings; SQLite serializes writers. Returns None on overlap. The
+    fallback tree sees the booking once the session commits."""
+    columns = list(reservation)
+    source = select(*[literal(reservation[c], getattr(models.Reservation, c).type) for c in columns]).where(~exists().where(
+        overlap_condition(reservation['item_id'], reservation['entry_date'], reservation['exit_date'], is_postgres(db))))
+    booked = await db.scalar(
+        insert(models.Reservation).from_select(columns, source).returning(models.Reservation),
+        execution_options={"synchronize_session": False},
+    )
+    if booked is not None:
+        db.info.setdefault('booked', []).append((booked.entry_date, booked.exit_date, booked.item_id))
+    return booked
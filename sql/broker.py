@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+import orjson
+from fastapi import WebSocket, status
+from fastapi.requests import HTTPConnection
+from sqlalchemy import select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .settings import Settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'messages'
+# ids of users whose cached logins every worker has to drop
+USERS_CHANNEL = 'users_changed'
+# user ids per notification, well within MAX_PAYLOAD
+USERS_PER_NOTIFY = 500
+# seconds between attempts to get the listening connection back
+RECONNECT_DELAY = 1.0
+# per-socket backlog; a client that falls further behind loses the oldest
+# pushes and resyncs from the inbox
+QUEUE_SIZE = 100
+# NOTIFY payloads are capped at 8000 bytes
+MAX_PAYLOAD = 7900
+
+
+class LocalBroker:
+    """Pushes new messages to the sockets of their sender and receiver that
+    are open in this process. Enough for a single worker and for tests."""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+        self._user_listeners: List[Callable[[Optional[List[int]]], None]] = []
+
+    @property
+    def listening(self) -> bool:
+        # whether changes made by other workers reach this one
+        return True
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        self._close_all()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        await self.start()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        self._subscribers[user_id].add(subscriber)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    async def publish(self, db: AsyncSession, message: dict):
+        self.deliver(message)
+
+    def on_users_changed(self, listener: Callable[[Optional[List[int]]], None]):
+        """Calls `listener` with the ids of users changed or deleted through
+        any worker, or with None when some changes may have been missed."""
+        self._user_listeners.append(listener)
+
+    async def users_changed(self, db: AsyncSession, user_ids: List[int]):
+        """Announces that these users changed once `db` commits; the caller
+        commits. In one process the caller updates its own caches."""
+
+    def _notify_user_listeners(self, user_ids: Optional[List[int]]):
+        for listener in self._user_listeners:
+            listener(user_ids)
+
+    def deliver(self, message: Optional[dict], user_ids=None):
+        if user_ids is None:
+            user_ids = {message['sender_id'], message['receiver_id']}
+        for user_id in user_ids:
+            for loop, queue in list(self._subscribers.get(user_id, ())):
+                # queues belong to the loop of the socket that owns them
+                loop.call_soon_threadsafe(_put, queue, message)
+
+    def _close_all(self):
+        # None tells each socket to close so its client reconnects
+        self.deliver(None, list(self._subscribers))
+
+
+def _put(queue: asyncio.Queue, message: Optional[dict]):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+class PostgresBroker(LocalBroker):
+    """Relays messages through LISTEN/NOTIFY, so a message sent through any
+    worker reaches sockets held by every other one. Each worker keeps one
+    dedicated listening connection, outside the pool."""
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._connection = None
+        self._lock = asyncio.Lock()
+        self._reconnect: Optional[asyncio.Task] = None
+        self._stopped = False
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None
+
+    async def start(self):
+        if self._connection is not None:
+            return
+        async with self._lock:
+            if self._connection is None:
+                import asyncpg
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(CHANNEL, self._on_notify)
+                await connection.add_listener(USERS_CHANNEL, self._on_users_notify)
+                connection.add_termination_listener(self._on_terminate)
+                self._connection = connection
+                self._stopped = False
+
+    async def stop(self):
+        self._stopped = True
+        if self._reconnect is not None:
+            self._reconnect.cancel()
+            self._reconnect = None
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            await connection.close()
+        self._close_all()
+
+    async def users_changed(self, db: AsyncSession, user_ids: List[int]):
+        # NOTIFY is sent on commit, and not at all on rollback
+        for start in range(0, len(user_ids), USERS_PER_NOTIFY):
+            payload = ','.join(str(user_id) for user_id in user_ids[start:start + USERS_PER_NOTIFY])
+            await db.execute(select(func.pg_notify(USERS_CHANNEL, payload)))
+
+    async def publish(self, db: AsyncSession, message: dict):
+        payload = orjson.dumps(message)
+        if len(payload) > MAX_PAYLOAD:
+            # clients fetch the full text from the thread
+            payload = orjson.dumps({**message, "text": None, "truncated": True})
+        await db.execute(select(func.pg_notify(CHANNEL, payload.decode())))
+        await db.commit()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.deliver(orjson.loads(payload))
+
+    def _on_users_notify(self, connection, pid, channel, payload):
+        self._notify_user_listeners([int(user_id) for user_id in payload.split(',')])
+
+    def _on_terminate(self, connection):
+        # notifications sent while disconnected are lost; drop the sockets,
+        # everything cached about users, and reconnect
+        self._connection = None
+        self._close_all()
+        self._notify_user_listeners(None)
+        if not self._stopped and self._reconnect is None:
+            self._reconnect = asyncio.ensure_future(self._keep_reconnecting())
+
+    async def _keep_reconnecting(self):
+        try:
+            while self._connection is None:
+                await asyncio.sleep(RECONNECT_DELAY)
+                try:
+                    await self.start()
+                except Exception as e:
+                    logger.warning('message broker reconnect failed: %s', e)
+            # whatever changed while disconnected
+            self._notify_user_listeners(None)
+        finally:
+            self._reconnect = None
+
+
+def make_broker(settings: Settings) -> LocalBroker:
+    url = make_url(settings.async_database_url)
+    use_postgres = url.get_backend_name() == 'postgresql' if settings.message_broker == 'auto' else settings.message_broker == 'postgres'
+    if use_postgres:
+        return PostgresBroker(url.set(drivername='postgresql').render_as_string(hide_password=False))
+    return LocalBroker()
+
+
+def get_broker(connection: HTTPConnection) -> LocalBroker:
+    """The broker of the app serving `connection`."""
+    return connection.app.state.broker
+
+
+async def relay(websocket: WebSocket, queue: asyncio.Queue):
+    """Forwards queued messages to `websocket` until either side closes.
+    Frames sent by the client are ignored."""
+    receive = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({receive, get}, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                message: Optional[dict] = get.result()
+                if message is None:
+                    await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+                    return
+                await websocket.send_text(orjson.dumps(message).decode())
+            else:
+                get.cancel()
+            if receive in done:
+                if receive.result()['type'] == 'websocket.disconnect':
+                    return
+                receive = asyncio.ensure_future(websocket.receive())
+    finally:
+        receive.cancel()
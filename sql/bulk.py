@@ -0,0 +1,168 @@
+import csv
+import json
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from asyncpg import PostgresError
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import geo, models, schemas, search
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+# at most this many row errors are kept per batch in the report
+MAX_ERRORS_PER_BATCH = 50
+
+IMPORTERS: Dict[str, Tuple[type, Type[BaseModel]]] = {
+    'users': (models.USER, schemas.UserCreate),
+    'items': (models.Item, schemas.ItemCreate),
+    'locations': (models.Location, schemas.LocationCreate),
+    'item-descriptions': (models.ItemDescription, schemas.ItemDescriptionCreate),
+    'features': (models.Feature, schemas.FeatureCreate),
+}
+
+# (line number, parsed row or None, parse error or None)
+Row = Tuple[int, Optional[dict], Optional[str]]
+
+
+def _decode(line: bytes) -> Tuple[Optional[str], Optional[str]]:
+    # (text, None), or (None, error) for a line that isn't UTF-8
+    try:
+        return line.decode('utf-8').rstrip('\r'), None
+    except UnicodeDecodeError as e:
+        return None, f'invalid UTF-8 at byte {e.start}'
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Optional[str], Optional[str]]]:
+    # split before decoding, so a character spanning two chunks stays whole
+    buffer = b''
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield _decode(line)
+    if buffer:
+        yield _decode(buffer)
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    line_no = 0
+    async for line, error in _lines(chunks):
+        line_no += 1
+        if error is not None:
+            yield line_no, None, error
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, 'expected a JSON object'
+            continue
+        yield line_no, row, None
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    # one record per line; quoted fields can't span lines in a streamed import
+    header = None
+    line_no = 0
+    async for line, error in _lines(chunks):
+        line_no += 1
+        if error is not None:
+            yield line_no, None, error
+            continue
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, None, f'expected {len(header)} fields, got {len(values)}'
+            continue
+        yield line_no, {name: (value if value != '' else None) for name, value in zip(header, values)}, None
+
+
+async def _insert(db: AsyncSession, model, rows: List[dict]) -> List[int]:
+    if model is models.Item:
+        # item ids are needed to build their search documents
+        result = await db.scalars(insert(models.Item).returning(models.Item.item_id), rows)
+        return result.all()
+    if search.is_postgres(db):
+        columns = list(rows[0])
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            model.__tablename__, records=[tuple(row[c] for c in columns) for row in rows], columns=columns)
+    else:
+        await db.execute(insert(model), rows)
+    return []
+
+
+async def _load_batch(db: AsyncSession, kind: str, number: int, batch: List[Row]) -> dict:
+    model, schema = IMPORTERS[kind]
+    valid, errors = [], []
+    for line_no, row, error in batch:
+        if error is None:
+            try:
+                valid.append(schema.model_validate(row).model_dump())
+                continue
+            except ValidationError as e:
+                error = '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        if len(errors) < MAX_ERRORS_PER_BATCH:
+            errors.append({"line": line_no, "error": error})
+    report = {"batch": number, "rows": len(batch), "inserted": 0, "failed": len(batch) - len(valid), "errors": errors}
+    if not valid:
+        return report
+    if model is models.Location:
+        # COPY doesn't apply the column default
+        for row in valid:
+            has_point = row['latitude'] is not None and row['longitude'] is not None
+            row['geohash'] = geo.encode(row['latitude'], row['longitude']) if has_point else None
+    try:
+        item_ids = await _insert(db, model, valid)
+        if model is models.Location:
+            item_ids = [row['item_id'] for row in valid]
+        await search.reindex_items(db, item_ids)
+        await db.commit()
+    # COPY runs on the raw asyncpg connection, so its errors aren't wrapped
+    # in DBAPIError
+    except (DBAPIError, PostgresError) as e:
+        await db.rollback()
+        report["failed"] = len(batch)
+        errors.append({"line": None, "error": str(getattr(e, 'orig', e))})
+        return report
+    report["inserted"] = len(valid)
+    return report
+
+
+async def import_rows(db: AsyncSession, kind: str, rows: AsyncIterator[Row], batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Validates and loads `rows` in batches; each batch commits on its own, so
+    a bad batch doesn't undo the ones before it."""
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    start = time.perf_counter()
+    batches, batch = [], []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            batches.append(await _load_batch(db, kind, len(batches) + 1, batch))
+            batch = []
+    if batch:
+        batches.append(await _load_batch(db, kind, len(batches) + 1, batch))
+    seconds = time.perf_counter() - start
+    inserted = sum(b["inserted"] for b in batches)
+    return {
+        "kind": kind,
+        "rows": sum(b["rows"] for b in batches),
+        "inserted": inserted,
+        "failed": sum(b["failed"] for b in batches),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(inserted / seconds, 1) if seconds else 0.0,
+        "batches": batches,
+    }
@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import Request, Response, status
+from fastapi.requests import HTTPConnection
+
+from .settings import Settings
+
+PREFIX = 'response-cache'
+
+# (etag, JSON body)
+Entry = Tuple[str, bytes]
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU whose entries expire `ttl` seconds after they
+    are stored."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Entry]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryBackend:
+    """Local stand-in for a shared backend, with the same interface as
+    RedisBackend. Only shared within this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] <= time.time():
+                self._values.pop(key, None)
+                return None
+            return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._values[key] = (time.time() + ttl, value)
+
+    async def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            # entries of older generations can't be read any more
+            self._values.clear()
+            return self._counters[key]
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments; needs the `redis`
+    package, which isn't a requirement otherwise."""
+
+    def __init__(self, url: str):
+        import redis.asyncio
+        self._redis = redis.asyncio.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def counter(self, key: str) -> int:
+        return int(await self._redis.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self._redis.incr(key)
+
+
+def etag_for(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def cache_key(request: Request) -> str:
+    # parameter order, blanks and repeated-value order don't change the result
+    params = sorted((name, value.strip()) for name, value in request.query_params.multi_items() if value.strip())
+    return f'{request.url.path}?{urlencode(params)}'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+
+
+def _respond(request: Request, entry: Entry) -> Response:
+    etag, body = entry
+    headers = {'ETag': etag}
+    if _not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+class ResponseCache:
+    """Caches JSON response bodies by normalized URL in an in-process LRU,
+    optionally backed by a shared backend. Writes to listings call
+    invalidate(), which starts a new generation of keys; with a shared
+    backend the generation is shared too, so every worker sees it. Without
+    one, other workers serve stale entries for at most `ttl` seconds."""
+
+    def __init__(self, local: LRUCache, shared=None):
+        self.local = local
+        self.shared = shared
+        self._generation = 0
+
+    async def _key(self, name: str) -> str:
+        generation = await self.shared.counter(f'{PREFIX}:generation') if self.shared else self._generation
+        return f'{PREFIX}:{generation}:{name}'
+
+    async def lookup(self, request: Request) -> Optional[Response]:
+        """A 200 or 304 response for a cached result, or None on a miss."""
+        entry = await self._get(await self._key(cache_key(request)))
+        return _respond(request, entry) if entry else None
+
+    async def _get(self, key: str) -> Optional[Entry]:
+        entry = self.local.get(key)
+        if entry is None and self.shared:
+            raw = await self.shared.get(key)
+            if raw is not None:
+                etag, body = raw.split(b'\n', 1)
+                entry = (etag.decode(), body)
+                self.local.put(key, entry)
+        return entry
+
+    async def _put(self, key: str, body: bytes) -> Entry:
+        entry = (etag_for(body), body)
+        self.local.put(key, entry)
+        if self.shared:
+            await self.shared.set(key, entry[0].encode() + b'\n' + entry[1], self.local.ttl)
+        return entry
+
+    async def store(self, request: Request, response: Response) -> Response:
+        """Caches a freshly built 200 response and returns it (or a 304) with
+        its ETag."""
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        entry = await self._put(await self._key(cache_key(request)), response.body)
+        return _respond(request, entry)
+
+    async def get(self, name: str) -> Optional[bytes]:
+        """A value cached with set() under `name`; invalidate() drops these
+        along with the responses."""
+        entry = await self._get(await self._key(name))
+        return entry[1] if entry else None
+
+    async def set(self, name: str, value: bytes):
+        await self._put(await self._key(name), value)
+
+    async def invalidate(self):
+        if self.shared:
+            await self.shared.incr(f'{PREFIX}:generation')
+        else:
+            self._generation += 1
+        self.local.clear()
+
+
+def make_cache(settings: Settings) -> ResponseCache:
+    shared = None
+    if settings.response_cache_url == 'memory://':
+        shared = MemoryBackend()
+    elif settings.response_cache_url:
+        shared = RedisBackend(settings.response_cache_url)
+    return ResponseCache(LRUCache(settings.response_cache_size, settings.response_cache_ttl), shared)
+
+
+def get_response_cache(connection: HTTPConnection) -> ResponseCache:
+    """The response cache of the app serving `connection`."""
+    return connection.app.state.response_cache
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Optional, Type
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+
+from . import database
+from .replicas import ReadRouter
+
+# rows fetched per round-trip from the server-side cursor, and per chunk sent
+YIELD_PER = 1000
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_format(request: Request, format: Optional[str]) -> Optional[str]:
+    """The streaming format asked for by ?format= or the Accept header, or
+    None for a regular JSON response."""
+    if format in MEDIA_TYPES:
+        return format
+    accept = request.headers.get('accept', '')
+    for name, media_type in MEDIA_TYPES.items():
+        if media_type in accept:
+            return name
+    return None
+
+
+def _ndjson_chunk(rows) -> str:
+    return ''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+
+
+def _csv_chunk(rows, fields) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+async def _rows(read_router: ReadRouter, query: Select, schema: Type[BaseModel], format: str) -> AsyncIterator[str]:
+    fields = list(schema.model_fields)
+    if format == 'csv':
+        yield _csv_chunk([dict(zip(fields, fields))], fields)
+    # the request's session is closed once the endpoint returns, before the
+    # body is sent, so the stream owns a (read) session of its own
+    async with await read_router.session() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=YIELD_PER))
+        async for partition in result.partitions():
+            rows = [schema.model_validate(obj, from_attributes=True).model_dump(mode='json') for obj in partition]
+            yield _csv_chunk(rows, fields) if format == 'csv' else _ndjson_chunk(rows)
+
+
+def stream(request: Request, query: Select, schema: Type[BaseModel], format: str, filename: str = 'export') -> StreamingResponse:
+    headers = {}
+    if format == 'csv':
+        headers['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return StreamingResponse(_rows(database.of(request).read_router, query, schema, format), media_type=MEDIA_TYPES[format],
+                             headers=headers)
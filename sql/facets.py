@@ -0,0 +1,94 @@
+from collections import defaultdict
+from typing import Dict, List
+from urllib.parse import urlencode
+
+from fastapi import Request
+from sqlalchemy import select, func, case, distinct
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .search import is_postgres
+
+# lower bounds of the price buckets; the last one is open-ended
+PRICE_BUCKETS = (0, 50, 100, 200, 500, 1000)
+# search parameters that don't change which houses match
+NOT_FILTERS = {'sort', 'cursor', 'limit', 'format', 'facets'}
+
+
+def _price_bucket(price):
+    return case(*[(price >= low, low) for low in reversed(PRICE_BUCKETS[1:])], else_=PRICE_BUCKETS[0])
+
+
+def _bucket_label(low: int) -> str:
+    index = PRICE_BUCKETS.index(low)
+    return f'{low}-{PRICE_BUCKETS[index + 1]}' if index + 1 < len(PRICE_BUCKETS) else f'{low}+'
+
+
+def _columns():
+    return {
+        "state": models.Location.state,
+        "city": models.Location.city,
+        "type": models.TypeList.name,
+        "price": _price_bucket(models.Item.price),
+        "capacity": models.ItemDescription.capacity,
+    }
+
+
+def _rows(ids, *columns):
+    # the matched houses with every facet value they have
+    return (
+        select(*columns)
+        .select_from(ids)
+        .join(models.Item, models.Item.item_id == ids.c.item_id)
+        .outerjoin(models.Location, models.Location.item_id == ids.c.item_id)
+        .outerjoin(models.Type, models.Type.item_id == ids.c.item_id)
+        .outerjoin(models.TypeList, models.TypeList.type_list_id == models.Type.type_list_id)
+        .outerjoin(models.ItemDescription, models.ItemDescription.item_id == ids.c.item_id)
+    )
+
+
+def _format(counts: Dict[str, Dict[object, int]]) -> Dict[str, List[dict]]:
+    facets = {}
+    for name, values in counts.items():
+        ordered = sorted(values.items(), key=lambda pair: (-pair[1], str(pair[0])))
+        facets[name] = [{"value": _bucket_label(value) if name == 'price' else str(value), "count": count}
+                        for value, count in ordered if value is not None]
+    return facets
+
+
+async def counts(db: AsyncSession, ids) -> Dict[str, List[dict]]:
+    """Number of matched houses per state, city, type, price bucket and
+    capacity; `ids` is a subquery of the matched item_ids. On Postgres this
+    is one GROUPING SETS query; SQLite has no GROUPING SETS, so there the
+    joined rows are read once and counted here."""
+    columns = _columns()
+    names = list(columns)
+    labelled = [column.label(name) for name, column in columns.items()]
+    if is_postgres(db):
+        rows = _rows(ids, ids.c.item_id, *labelled).subquery()
+        grouped = [rows.c[name] for name in names]
+        query = select(
+            *grouped, func.grouping(*grouped).label('grouping'), func.count(distinct(rows.c.item_id)).label('houses'),
+        ).group_by(func.grouping_sets(*grouped))
+        # GROUPING(...) has a bit set for each column a row is *not* grouped by
+        all_bits = (1 << len(names)) - 1
+        facet_of = {all_bits ^ (1 << (len(names) - 1 - index)): index for index in range(len(names))}
+        result: Dict[str, Dict[object, int]] = {name: {} for name in names}
+        for row in await db.execute(query):
+            index = facet_of[row.grouping]
+            result[names[index]][row[index]] = row.houses
+        return _format(result)
+
+    seen = {name: defaultdict(set) for name in names}
+    for row in await db.execute(_rows(ids, ids.c.item_id, *labelled)):
+        for index, name in enumerate(names, 1):
+            seen[name][row[index]].add(row[0])
+    return _format({name: {value: len(items) for value, items in values.items()} for name, values in seen.items()})
+
+
+def cache_name(request: Request) -> str:
+    # facets only depend on the filters, so every page and sort order of a
+    # search shares one entry
+    params = sorted((name, value.strip()) for name, value in request.query_params.multi_items()
+                    if value.strip() and name not in NOT_FILTERS)
+    return f'facets:{request.url.path}?{urlencode(params)}'
@@ -0,0 +1,92 @@
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# stored precision: cells of about 5 x 5 m
+PRECISION = 9
+# a radius search reads at most this many cells, coarser ones if needed
+MAX_CELLS = 16
+# the largest radius /houses/near accepts
+MAX_RADIUS_KM = 100.0
+
+
+def encode(latitude: float, longitude: float, precision: int = PRECISION) -> str:
+    """Geohash of a point: nearby points share a prefix, so a B-tree on the
+    hash answers "which points are in this cell" with a range scan."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) of a cell in degrees."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # haversine
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _steps(low: float, high: float, step: float) -> List[float]:
+    # points no further apart than a cell, so every cell in [low, high] is hit
+    return [low + k * step for k in range(int((high - low) / step) + 1)] + [high]
+
+
+def covering_cells(latitude: float, longitude: float, radius_km: float) -> List[str]:
+    """Geohash prefixes of the cells that cover the circle's bounding box,
+    at the finest precision that needs at most MAX_CELLS of them."""
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    cos_lat = min(math.cos(math.radians(south)), math.cos(math.radians(north)))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, dlat / cos_lat)
+    west, east = longitude - dlon, longitude + dlon
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        if (int((north - south) / height) + 2) * (int((east - west) / width) + 2) <= MAX_CELLS:
+            break
+    return sorted({encode(lat, (lon + 180.0) % 360.0 - 180.0, precision)
+                   for lat in _steps(south, north, height) for lon in _steps(west, east, width)})
+
+
+def _successor(prefix: str) -> Optional[str]:
+    # the smallest hash after every hash starting with prefix
+    while prefix and prefix[-1] == BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def in_cells(column, cells: List[str]):
+    """Condition for `column` (a geohash) lying in any of the cells, as
+    range comparisons that can use its index; LIKE 'prefix%' can't on
+    either SQLite or a non-C Postgres collation."""
+    ranges = []
+    for cell in cells:
+        upper = _successor(cell)
+        ranges.append(column >= cell if upper is None else and_(column >= cell, column < upper))
+    return or_(*ranges)
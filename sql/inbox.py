@@ -0,0 +1,28 @@
+from sqlalchemy import Select, select, func, case, or_, and_
+
+from . import models
+
+
+def conversations(user_id: int) -> Select:
+    """One row per (counterpart, item) thread `user_id` takes part in, with
+    the thread's size and its last message. Keyset on last_message_id."""
+    counterpart = case((models.Message.sender_id == user_id, models.Message.receiver_id), else_=models.Message.sender_id)
+    threads = select(
+        counterpart.label('counterpart_id'),
+        models.Message.item_id.label('item_id'),
+        func.max(models.Message.message_id).label('last_message_id'),
+        func.count().label('message_count'),
+    ).where(
+        or_(models.Message.sender_id == user_id, models.Message.receiver_id == user_id)
+    ).group_by(counterpart, models.Message.item_id).subquery('threads')
+    return select(threads, models.Message).join(models.Message, models.Message.message_id == threads.c.last_message_id)
+
+
+def thread(user_id: int, counterpart_id: int, item_id: int) -> Select:
+    return select(models.Message).where(
+        models.Message.item_id == item_id,
+        or_(
+            and_(models.Message.sender_id == user_id, models.Message.receiver_id == counterpart_id),
+            and_(models.Message.sender_id == counterpart_id, models.Message.receiver_id == user_id),
+        ),
+    )
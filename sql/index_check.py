@@ -0,0 +1,55 @@
+"""Flags foreign-key and lookup columns that no index covers.
+
+A column counts as covered when it is the leading column of an index, a
+unique constraint or the primary key. Run `python -m sql.index_check`; the
+exit status is non-zero when something is missing.
+"""
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import MetaData
+
+from . import models
+
+# columns the routes filter on by equality, besides foreign keys
+LOOKUP_COLUMNS = (
+    ('users', 'email'),
+    ('users', 'phone'),
+)
+
+
+def leading_columns(table) -> set:
+    leading = set()
+    if table.primary_key.columns:
+        leading.add(list(table.primary_key.columns)[0].name)
+    for index in table.indexes:
+        columns = list(index.columns)
+        if columns:
+            leading.add(columns[0].name)
+    for constraint in table.constraints:
+        columns = list(getattr(constraint, 'columns', ()))
+        if columns and constraint.__visit_name__ == 'unique_constraint':
+            leading.add(columns[0].name)
+    return leading
+
+
+def unindexed_columns(metadata: MetaData = models.Base.metadata) -> List[Tuple[str, str, str]]:
+    missing = []
+    lookups = set(LOOKUP_COLUMNS)
+    for table in metadata.sorted_tables:
+        covered = leading_columns(table)
+        for column in table.columns:
+            if column.name in covered:
+                continue
+            if column.foreign_keys:
+                missing.append((table.name, column.name, 'foreign key'))
+            elif (table.name, column.name) in lookups:
+                missing.append((table.name, column.name, 'lookup'))
+    return missing
+
+
+if __name__ == '__main__':
+    problems = unindexed_columns()
+    for table, column, reason in problems:
+        print(f'{table}.{column}: unindexed {reason} column')
+    sys.exit(1 if problems else 0)
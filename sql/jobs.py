@@ -0,0 +1,37 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update as sql_update, delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+
+# finished or not, jobs are forgotten after this long
+RETENTION = timedelta(days=7)
+
+
+def _as_dict(job: models.Job) -> dict:
+    return {"job_id": job.job_id, "kind": job.kind, "status": job.status, "result": job.result, "error": job.error}
+
+
+async def create(db: AsyncSession, kind: str) -> dict:
+    """Records a pending job and commits, so it can be polled from any
+    worker before the job starts."""
+    await db.execute(delete(models.Job).where(models.Job.created_at < datetime.utcnow() - RETENTION))
+    job = models.Job(job_id=uuid.uuid4().hex, kind=kind, status="pending")
+    db.add(job)
+    await db.commit()
+    return _as_dict(job)
+
+
+async def get(db: AsyncSession, job_id: str) -> Optional[dict]:
+    job = await db.get(models.Job, job_id)
+    return _as_dict(job) if job is not None else None
+
+
+async def update(sessionmaker: async_sessionmaker, job_id: str, **fields):
+    # in a transaction of its own, apart from the job's work
+    async with sessionmaker() as db:
+        await db.execute(sql_update(models.Job).where(models.Job.job_id == job_id).values(**fields))
+        await db.commit()
@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger('sql.slow_query')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    __slots__ = ('scope', 'queries', 'db_seconds')
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # the path template, so /houses/1 and /houses/2 share a series; the
+        # router adds it to the scope once the request is matched
+        route = self.scope.get('route')
+        return getattr(route, 'path', None) or 'unmatched'
+
+
+# set for the duration of each request by MetricsMiddleware
+current_request: ContextVar[Optional[RequestStats]] = ContextVar('current_request', default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...], labels: Tuple[str, ...]):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        self._lock = threading.Lock()
+        # label values -> (per-bucket counts, sum)
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(label_values, [[0] * (len(self.buckets) + 1), 0.0])
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: ([*counts], total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name, self.help, self.labels = name, help, labels
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _labels(names, values) -> str:
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency by route.', LATENCY_BUCKETS, ('method', 'route'))
+requests_total = Counter('http_requests_total', 'Requests by route and status.', ('method', 'route', 'status'))
+request_queries = Histogram('db_queries_per_request', 'SQL statements per request, by route.', QUERY_BUCKETS, ('method', 'route'))
+db_seconds_total = Counter('db_query_seconds_total', 'Time spent in SQL statements, by route.', ('route',))
+slow_queries_total = Counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS, by route.', ('route',))
+METRICS = [request_duration, requests_total, request_queries, db_seconds_total, slow_queries_total]
+
+
+def instrument(engine, slow_query_ms: float = 0):
+    """Counts and times every statement run on `engine` (a sync Engine, or an
+    AsyncEngine's sync_engine) against the current request, and logs those
+    slower than `slow_query_ms` (0: none)."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            route = stats.route if stats is not None else 'none'
+            slow_queries_total.inc(route)
+            logger.warning('slow query (%.1f ms) in %s: %s', elapsed * 1000, route, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        # after_cursor_execute doesn't run for failed statements
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class MetricsMiddleware:
+    """Sets up RequestStats for each HTTP request, reports its database
+    time in a Server-Timing header and records the route's metrics once
+    the response (including any streamed body) is done."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                timing = (f'db;desc="{stats.queries} queries";dur={stats.db_seconds * 1000:.3f}, '
+                          f'app;dur={(time.perf_counter() - start) * 1000:.3f}')
+                message['headers'] = [*message.get('headers', []), (b'server-timing', timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = stats.route
+            method = scope['method']
+            request_duration.observe(time.perf_counter() - start, method, route)
+            request_queries.observe(stats.queries, method, route)
+            requests_total.inc(method, route, status_code)
+            db_seconds_total.inc(route, amount=stats.db_seconds)
+
+
+def render(pools: Dict[str, dict] = None) -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    # connection pool state, from sql.pool.pool_status
+    for key, kind in [('checked_out', 'gauge'), ('idle', 'gauge'), ('overflow', 'gauge'),
+                      ('checkouts', 'counter'), ('timeouts', 'counter')]:
+        name = f'db_pool_{key}' + ('_total' if kind == 'counter' else '')
+        lines.append(f'# TYPE {name} {kind}')
+        for pool, status in (pools or {}).items():
+            if key in status:
+                lines.append(f'{name}{{pool="{pool}"}} {status[key]}')
+    return '\n'.join(lines) + '\n'
@@ -1,20 +1,25 @@
+from datetime import datetime
+
 from sqlalchemy import Column, Integer, String, TEXT, CHAR, Date, DECIMAL, ForeignKey, CheckConstraint, TIME, BOOLEAN, \
-    DATE
-from sqlalchemy.orm import relationship
+    DATE, Float, Index, DDL, event, func, literal_column, JSON, DateTime
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.orm import relationship, query_expression
 
+from . import geo
 from .database import Base
 
 class USER(Base):
     __tablename__ = 'users'
 
     user_id = Column(Integer, primary_key=True, index=True)
-    phone = Column(String(11), nullable=True)
+    # unique, so registration can insert with ON CONFLICT instead of checking first
+    phone = Column(String(11), nullable=True, index=True, unique=True)
     first_name = Column(String(20), nullable=False)
     last_name = Column(String(20), nullable=False)
     national_code = Column(CHAR(10), nullable=False)
     gender = Column(CHAR(1), nullable=False)
     date_of_birth = Column(Date, nullable=False)
-    email = Column(String(50), nullable=False)
+    email = Column(String(50), nullable=False, index=True)
     home_phone = Column(String(11), nullable=True)
     description = Column(TEXT, nullable=True)
 
@@ -31,11 +36,34 @@ class Item(Base):
     __tablename__ = 'items'
 
     item_id = Column(Integer, primary_key=True, index=True)
-    owner_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    owner_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
     name = Column(String(50), nullable=False)
     price = Column(DECIMAL(10, 2), nullable=False)
     about = Column(TEXT)
 
+    # populated by search_houses when results are ranked by a text query
+    relevance = query_expression()
+    # populated by search_houses when results are sorted by rating
+    rating = query_expression()
+
+    # child rows are removed by ON DELETE CASCADE, hence passive_deletes
+    locations = relationship('Location', passive_deletes=True)
+    descriptions = relationship('ItemDescription', passive_deletes=True)
+    features = relationship('Feature', back_populates='item', passive_deletes=True)
+    rules = relationship('Rule', back_populates='item', passive_deletes=True)
+    open_close = relationship('OpenClose', back_populates='item', passive_deletes=True)
+    types = relationship('Type', back_populates='item', passive_deletes=True)
+    type_lists = relationship('TypeList', secondary='type', viewonly=True)
+    ratings = relationship('Rating', passive_deletes=True)
+    comments = relationship('CommentSection', passive_deletes=True)
+
+    # backs the (price, item_id) keyset used by price-sorted searches; the
+    # unique index is the duplicate check of create-house
+    __table_args__ = (
+        Index('ix_items_price_item_id', price, item_id),
+        Index('ix_items_name_about', name, about, unique=True),
+    )
+
 
 class TypeList(Base):
     __tablename__ = 'type_list'
@@ -47,12 +75,19 @@ class Type(Base):
     __tablename__ = 'type'
 
     type_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
-    type_list_id = Column(Integer, ForeignKey('type_list.type_list_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
+    type_list_id = Column(Integer, ForeignKey('type_list.type_list_id'), nullable=False, index=True)
 
-    item = relationship("Item")
+    item = relationship("Item", back_populates="types")
     type_list = relationship("TypeList")
 
+def _geohash(context):
+    params = context.get_current_parameters()
+    if params.get('latitude') is None or params.get('longitude') is None:
+        return None
+    return geo.encode(params['latitude'], params['longitude'])
+
+
 class Location(Base):
     __tablename__ = 'location'
 
@@ -60,17 +95,21 @@ class Location(Base):
     state = Column(String(50), nullable=False)
     city = Column(String(50), nullable=False)
     exact_loc = Column(String(255), nullable=False)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    # filled in from the coordinates on insert; see sql.geo
+    geohash = Column(String(12), nullable=True, index=True, default=_geohash)
 
 class Feature(Base):
     __tablename__ = 'features'
 
     feature_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     more_detail = Column(TEXT)
 
-    item = relationship("Item")
+    item = relationship("Item", back_populates="features")
 
 class OpenClose(Base):
     __tablename__ = 'open_close'
@@ -78,27 +117,27 @@ class OpenClose(Base):
     open_close_id = Column(Integer, primary_key=True, index=True)
     open_time = Column(TIME, nullable=False)
     close_time = Column(TIME, nullable=False)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
 
-    item = relationship("Item")
+    item = relationship("Item", back_populates="open_close")
 
 class Rule(Base):
     __tablename__ = 'rules'
 
     rule_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     value = Column(BOOLEAN, nullable=False)
 
-    item = relationship("Item")
+    item = relationship("Item", back_populates="rules")
 
 class Rating(Base):
     __tablename__ = 'ratings'
 
     rating_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
     total_rate = Column(Integer, nullable=False)
-    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
 
 
 class Rate(Base):
@@ -107,22 +146,25 @@ class Rate(Base):
     rate_id = Column(Integer, primary_key=True, index=True)
     rate_title = Column(String(255), nullable=False)
     rate = Column(Integer, nullable=False)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
-    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
+    # the rating these were given with; NULL for older rates of a user who
+    # rated the item more than once, which can't be told apart
+    rating_id = Column(Integer, ForeignKey('ratings.rating_id', ondelete='CASCADE'), nullable=True, index=True)
 
 
 class Property(Base):
     __tablename__ = 'properties'
 
     property_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
     status = Column(String(255), nullable=False)
 
 class ItemDescription(Base):
     __tablename__ = 'item_description'
 
     item_desc_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
     capacity = Column(Integer, nullable=False)
     room = Column(Integer, nullable=False)
     single_bed = Column(Integer, nullable=False)
@@ -137,26 +179,35 @@ class Message(Base):
     __tablename__ = 'messages'
 
     message_id = Column(Integer, primary_key=True, index=True)
-    sender_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    sender_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
     receiver_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
     text = Column(TEXT, nullable=False)
 
+    __table_args__ = (
+        Index('ix_messages_receiver_id_sender_id', receiver_id, sender_id),
+    )
+
 
 class Like(Base):
     __tablename__ = 'likes'
 
     like_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # an item is favorited once per user; also serves lookups by user_id alone
+    __table_args__ = (
+        Index('ix_likes_user_id_item_id', user_id, item_id, unique=True),
+    )
 
 
 class CommentSection(Base):
     __tablename__ = 'comment_section'
 
     comment_id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
-    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
     comment = Column(TEXT, nullable=False)
 
 
@@ -164,19 +215,27 @@ class Reservation(Base):
     __tablename__ = 'reservations'
 
     res_id = Column(Integer, primary_key=True, index=True)
-    renter_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
-    item_id = Column(Integer, ForeignKey('items.item_id'), nullable=False)
+    renter_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), nullable=False)
     entry_date = Column(DATE, nullable=False)
     exit_date = Column(DATE, nullable=False)
     passengers_number = Column(Integer, nullable=False)
     final_price = Column(DECIMAL(10, 2), nullable=False)
 
+    # stays are half-open [entry_date, exit_date): a guest may check in on the
+    # day the previous one leaves
+    __table_args__ = (
+        Index('ix_reservations_item_id_dates', item_id, entry_date, exit_date),
+        ExcludeConstraint((item_id, '='), (func.daterange(entry_date, exit_date), '&&'),
+                          name='reservations_no_overlap', using='gist').ddl_if(dialect='postgresql'),
+    )
+
 
 class Application(Base):
     __tablename__ = 'applications'
 
     app_id = Column(Integer, primary_key=True, index=True)
-    res_id = Column(Integer, ForeignKey('reservations.res_id'), nullable=False)
+    res_id = Column(Integer, ForeignKey('reservations.res_id', ondelete='CASCADE'), nullable=False, index=True)
     status = Column(String, nullable=False)
 
 
@@ -184,8 +243,8 @@ class Invoice(Base):
     __tablename__ = 'invoice'
 
     invoice_id = Column(Integer, primary_key=True, index=True)
-    app_id = Column(Integer, ForeignKey('applications.app_id'), nullable=False)
-    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    app_id = Column(Integer, ForeignKey('applications.app_id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
     date = Column(DATE, nullable=False)
     discount = Column(DECIMAL(10, 2), nullable=False)
     status = Column(String, nullable=False)
@@ -195,7 +254,7 @@ class Payment(Base):
     __tablename__ = 'payment'
 
     payment_id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey('invoice.invoice_id'), nullable=False)
+    invoice_id = Column(Integer, ForeignKey('invoice.invoice_id', ondelete='CASCADE'), nullable=False, index=True)
     date = Column(DATE, nullable=False)
 
 
@@ -203,4 +262,93 @@ class InvoiceLine(Base):
     __tablename__ = 'invoice_line'
 
     invoice_line_id = Column(Integer, primary_key=True, index=True)
-    payment_id = Column(Integer, ForeignKey('payment.payment_id'), nullable=False)
+    payment_id = Column(Integer, ForeignKey('payment.payment_id', ondelete='CASCADE'), nullable=False, index=True)
+
+
+class ItemSearch(Base):
+    __tablename__ = 'item_search'
+
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), primary_key=True)
+    document = Column(TEXT, nullable=False)
+
+    __table_args__ = (
+        Index('ix_item_search_tsv', func.to_tsvector(literal_column("'simple'"), document),
+              postgresql_using='gin').ddl_if(dialect='postgresql'),
+        Index('ix_item_search_trgm', document, postgresql_using='gin',
+              postgresql_ops={'document': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+# running totals over ratings / rates, kept in step by sql.ratings
+class ItemRating(Base):
+    __tablename__ = 'item_ratings'
+
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), primary_key=True)
+    rating_count = Column(Integer, nullable=False)
+    rating_sum = Column(Integer, nullable=False)
+    # rating_sum / rating_count, stored so searches can filter and sort on it
+    rating = Column(Float, index=True)
+
+
+class ItemRateTotal(Base):
+    __tablename__ = 'item_rate_totals'
+
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), primary_key=True)
+    rate_title = Column(String(255), primary_key=True)
+    rate_count = Column(Integer, nullable=False)
+    rate_sum = Column(Integer, nullable=False)
+
+# reporting summaries, refreshed from invoices and reservations by sql.reports
+class HostRevenue(Base):
+    __tablename__ = 'host_revenue'
+
+    host_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    # first day of the invoices' month
+    month = Column(Date, primary_key=True)
+    invoices = Column(Integer, nullable=False)
+    paid_invoices = Column(Integer, nullable=False)
+    invoiced_amount = Column(DECIMAL(14, 2), nullable=False)
+    paid_amount = Column(DECIMAL(14, 2), nullable=False)
+
+
+class ItemOccupancy(Base):
+    __tablename__ = 'item_occupancy'
+
+    item_id = Column(Integer, ForeignKey('items.item_id', ondelete='CASCADE'), primary_key=True)
+    # first day of the month the nights fall in
+    month = Column(Date, primary_key=True)
+    host_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    booked_nights = Column(Integer, nullable=False)
+    reservations = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_item_occupancy_host_id_month', host_id, month),
+    )
+
+
+class ReportWatermark(Base):
+    __tablename__ = 'report_watermarks'
+
+    # source table, the highest id of it folded into the summaries, and when
+    # (UTC) they were last rebuilt from all of it
+    source = Column(String(50), primary_key=True)
+    last_id = Column(Integer, nullable=False)
+    rebuilt_at = Column(DateTime, nullable=True)
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    # in the database rather than in memory, so any worker can report on a
+    # job another one runs
+    job_id = Column(String(32), primary_key=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(TEXT, nullable=True)
+    # UTC
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+event.listen(Reservation.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+event.listen(ItemSearch.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
@@ -0,0 +1,59 @@
+import base64
+import json
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_, literal
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps(list(values), default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> list:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise invalid_cursor
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise invalid_cursor
+    try:
+        return [key.type.python_type(value) for key, value in zip(keys, values)]
+    except (TypeError, ValueError, ArithmeticError):
+        raise invalid_cursor
+
+
+def keyset(query: Select, keys: Sequence, cursor: Optional[str], limit: Optional[int], descending: bool = False) -> Select:
+    # keys must end with a unique column so the ordering is total; one extra
+    # row is fetched to tell whether there is a next page. limit=None returns
+    # everything after the cursor (exports)
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        if len(keys) == 1:
+            left, right = keys[0], literal(values[0], keys[0].type)
+        else:
+            left, right = tuple_(*keys), tuple_(*[literal(v, k.type) for k, v in zip(keys, values)])
+        query = query.where(left < right if descending else left > right)
+    order = [key.desc() for key in keys] if descending else list(keys)
+    query = query.order_by(*order)
+    return query if limit is None else query.limit(limit + 1)
+
+
+def page(rows: List, keys: Sequence, limit: int) -> Tuple[List, Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, key.key) for key in keys])
@@ -0,0 +1,136 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, update, insert, func, cast, case, union, Float
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .search import is_postgres
+
+
+def _average(total, count):
+    return case((count > 0, cast(total, Float) / count), else_=None)
+
+
+def _totals(rates: Iterable[Tuple[str, int]]) -> Dict[str, Tuple[int, int]]:
+    totals = defaultdict(lambda: (0, 0))
+    for title, rate in rates:
+        count, total = totals[title]
+        totals[title] = (count + 1, total + rate)
+    return totals
+
+
+async def add_rating(db: AsyncSession, rating: dict, rates: List[dict]) -> models.Rating:
+    """Stores a rating with its per-criterion rates and folds them into the
+    item's aggregates. The caller commits."""
+    db_rating = models.Rating(**rating)
+    db.add(db_rating)
+    await db.flush()
+    if rates:
+        await db.execute(insert(models.Rate), [
+            {"item_id": rating['item_id'], "user_id": rating['user_id'], "rating_id": db_rating.rating_id, **rate}
+            for rate in rates])
+
+    dialect_insert = postgresql.insert if is_postgres(db) else sqlite.insert
+    stmt = dialect_insert(models.ItemRating).values(
+        item_id=rating['item_id'], rating_count=1, rating_sum=rating['total_rate'], rating=float(rating['total_rate']))
+    count = models.ItemRating.rating_count + stmt.excluded.rating_count
+    total = models.ItemRating.rating_sum + stmt.excluded.rating_sum
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.ItemRating.item_id],
+        set_={"rating_count": count, "rating_sum": total, "rating": _average(total, count)},
+    ))
+    totals = _totals((rate['rate_title'], rate['rate']) for rate in rates)
+    if totals:
+        stmt = dialect_insert(models.ItemRateTotal).values([
+            {"item_id": rating['item_id'], "rate_title": title, "rate_count": count, "rate_sum": total}
+            for title, (count, total) in totals.items()])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.ItemRateTotal.item_id, models.ItemRateTotal.rate_title],
+            set_={"rate_count": models.ItemRateTotal.rate_count + stmt.excluded.rate_count,
+                  "rate_sum": models.ItemRateTotal.rate_sum + stmt.excluded.rate_sum},
+        ))
+    return db_rating
+
+
+async def remove_rating(db: AsyncSession, rating_id: int) -> Optional[models.Rating]:
+    """Deletes a rating together with the rates given with it and takes them
+    back out of the aggregates. The caller commits."""
+    rates = (await db.execute(
+        delete(models.Rate).where(models.Rate.rating_id == rating_id).returning(models.Rate.rate_title, models.Rate.rate),
+        execution_options={"synchronize_session": False},
+    )).all()
+    deleted = await db.scalar(
+        delete(models.Rating).where(models.Rating.rating_id == rating_id).returning(models.Rating),
+        execution_options={"synchronize_session": False},
+    )
+    if deleted is None:
+        return None
+
+    count = models.ItemRating.rating_count - 1
+    total = models.ItemRating.rating_sum - deleted.total_rate
+    await db.execute(
+        update(models.ItemRating).where(models.ItemRating.item_id == deleted.item_id)
+        .values(rating_count=count, rating_sum=total, rating=_average(total, count)),
+        execution_options={"synchronize_session": False},
+    )
+    for title, (count, total) in _totals(rates).items():
+        await db.execute(
+            update(models.ItemRateTotal)
+            .where(models.ItemRateTotal.item_id == deleted.item_id, models.ItemRateTotal.rate_title == title)
+            .values(rate_count=models.ItemRateTotal.rate_count - count, rate_sum=models.ItemRateTotal.rate_sum - total),
+            execution_options={"synchronize_session": False},
+        )
+    await db.execute(delete(models.ItemRateTotal).where(
+        models.ItemRateTotal.item_id == deleted.item_id, models.ItemRateTotal.rate_count <= 0))
+    return deleted
+
+
+async def items_rated_by(db: AsyncSession, user_ids: List[int]) -> List[int]:
+    # items whose aggregates change when these users' ratings go away
+    rated = union(
+        select(models.Rating.item_id).where(models.Rating.user_id.in_(user_ids)),
+        select(models.Rate.item_id).where(models.Rate.user_id.in_(user_ids)),
+    )
+    return (await db.scalars(rated)).all()
+
+
+async def rebuild(db: AsyncSession, item_ids: Optional[List[int]] = None) -> int:
+    """Recomputes the aggregates of `item_ids` (every item when None) from the
+    raw rows, two INSERT ... SELECT statements. The caller commits."""
+    ratings = select(
+        models.Rating.item_id, func.count(), func.sum(models.Rating.total_rate),
+        cast(func.sum(models.Rating.total_rate), Float) / func.count(),
+    ).group_by(models.Rating.item_id)
+    rates = select(
+        models.Rate.item_id, models.Rate.rate_title, func.count(), func.sum(models.Rate.rate),
+    ).group_by(models.Rate.item_id, models.Rate.rate_title)
+    clear_ratings, clear_rates = delete(models.ItemRating), delete(models.ItemRateTotal)
+    if item_ids is not None:
+        if not item_ids:
+            return 0
+        ratings = ratings.where(models.Rating.item_id.in_(item_ids))
+        rates = rates.where(models.Rate.item_id.in_(item_ids))
+        clear_ratings = clear_ratings.where(models.ItemRating.item_id.in_(item_ids))
+        clear_rates = clear_rates.where(models.ItemRateTotal.item_id.in_(item_ids))
+
+    await db.execute(clear_ratings)
+    await db.execute(clear_rates)
+    result = await db.execute(insert(models.ItemRating).from_select(
+        ['item_id', 'rating_count', 'rating_sum', 'rating'], ratings))
+    await db.execute(insert(models.ItemRateTotal).from_select(
+        ['item_id', 'rate_title', 'rate_count', 'rate_sum'], rates))
+    return result.rowcount
+
+
+async def summary(db: AsyncSession, item_id: int) -> dict:
+    aggregate = await db.get(models.ItemRating, item_id)
+    totals = await db.scalars(select(models.ItemRateTotal).where(models.ItemRateTotal.item_id == item_id)
+                              .order_by(models.ItemRateTotal.rate_title))
+    return {
+        "item_id": item_id,
+        "rating_count": aggregate.rating_count if aggregate else 0,
+        "rating": aggregate.rating if aggregate else None,
+        "criteria": {total.rate_title: total.rate_sum / total.rate_count for total in totals},
+    }
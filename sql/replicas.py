@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from .pool import pool_status
+
+logger = logging.getLogger(__name__)
+
+# carries when the client last committed a write, signed
+WROTE_AT_COOKIE = 'wrote_at'
+# seconds since the last replayed transaction; NULL on a primary
+REPLICATION_LAG = text('SELECT extract(epoch FROM now() - pg_last_xact_replay_timestamp())')
+
+
+class ReadRouter:
+    """Hands out sessions for read-only work: round-robin over the healthy
+    replicas, falling back to the primary when there are none. A replica
+    that fails to connect, or that the monitor finds down or lagging more
+    than `max_lag` seconds, is skipped for `retry_seconds`. Clients that
+    committed a write in the last `sticky_seconds` read from the primary,
+    so they see their own writes despite replication lag; when they wrote
+    travels with them in a cookie signed with `secret` (see
+    ReadYourWritesMiddleware), so that holds whichever worker they reach."""
+
+    def __init__(self, primary: async_sessionmaker, replicas: List[AsyncEngine], sticky_seconds: float = 10.0,
+                 retry_seconds: float = 5.0, max_lag: float = 0.0, secret: str = '', info: Optional[dict] = None):
+        self.primary = primary
+        self.engines = replicas
+        self.replicas = [async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+                                            info=info) for engine in replicas]
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.max_lag = max_lag
+        self._secret = secret.encode()
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._down_until: Dict[int, float] = {}
+        self._monitor: Optional[asyncio.Task] = None
+
+    def _sign(self, value: str) -> str:
+        return hmac.new(self._secret, value.encode(), hashlib.sha256).hexdigest()
+
+    def stamp(self, wrote_at: float) -> str:
+        """The wrote-at cookie value for a write committed at `wrote_at`."""
+        value = f'{wrote_at:.3f}'
+        return f'{value}.{self._sign(value)}'
+
+    def is_sticky(self, stamp: Optional[str]) -> bool:
+        # a stamp that doesn't verify counts as no recent write
+        if not stamp:
+            return False
+        value, _, signature = stamp.rpartition('.')
+        if not hmac.compare_digest(signature, self._sign(value)):
+            return False
+        try:
+            wrote_at = float(value)
+        except ValueError:
+            return False
+        return time.time() - wrote_at < self.sticky_seconds
+
+    def mark_down(self, index: int, reason: str):
+        logger.warning('read replica %d unavailable for %.0f s: %s', index, self.retry_seconds, reason)
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def _mark_up(self, index: int):
+        with self._lock:
+            self._down_until.pop(index, None)
+
+    def _candidates(self) -> List[int]:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i in range(len(self.replicas)) if self._down_until.get(i, 0) <= now]
+        if not healthy:
+            return []
+        start = next(self._turn) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    async def session(self, stamp: Optional[str] = None) -> AsyncSession:
+        """A session on a replica, or on the primary if the wrote-at `stamp`
+        is recent or no replica can be reached. The caller closes it."""
+        if not self.is_sticky(stamp):
+            for index in self._candidates():
+                db = self.replicas[index]()
+                try:
+                    # connect now, so a dead replica fails over here rather
+                    # than in the middle of the route
+                    await db.connection()
+                except (DBAPIError, OSError) as e:
+                    await db.close()
+                    self.mark_down(index, str(e))
+                    continue
+                return db
+        return self.primary()
+
+    async def check(self):
+        """Pings every replica, and on Postgres checks its replication lag."""
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as conn:
+                    if engine.dialect.name == 'postgresql' and self.max_lag:
+                        lag = await conn.scalar(REPLICATION_LAG)
+                        if lag is not None and lag > self.max_lag:
+                            self.mark_down(index, f'{lag:.1f} s behind the primary')
+                            continue
+                    else:
+                        await conn.execute(text('SELECT 1'))
+            except (DBAPIError, OSError) as e:
+                self.mark_down(index, str(e))
+                continue
+            self._mark_up(index)
+
+    async def _run_monitor(self):
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception('read replica check failed')
+            await asyncio.sleep(self.retry_seconds)
+
+    def start(self):
+        if self.engines and self._monitor is None:
+            self._monitor = asyncio.create_task(self._run_monitor())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        for engine in self.engines:
+            await engine.dispose()
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            down = dict(self._down_until)
+        return [{"replica": index, "url": engine.url.render_as_string(hide_password=True),
+                 "healthy": down.get(index, 0) <= now, "pool": pool_status(engine.pool)}
+                for index, engine in enumerate(self.engines)]
+
+
+class ReadYourWritesMiddleware:
+    """Sets the wrote-at cookie on responses to requests that committed a
+    write through get_async_db, which records the time in the request's
+    state. Only apps with replicas record it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            wrote_at = scope.get('state', {}).get('wrote_at')
+            if message['type'] == 'http.response.start' and wrote_at is not None:
+                router = scope['app'].state.database.read_router
+                cookie = (f'{WROTE_AT_COOKIE}={router.stamp(wrote_at)}; Max-Age={max(1, round(router.sticky_seconds))}; '
+                          f'Path=/; HttpOnly; SameSite=Lax')
+                message['headers'] = [*message.get('headers', []), (b'set-cookie', cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -0,0 +1,244 @@
+import asyncio
+import calendar
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, insert, delete, func, cast, case, literal_column, Date, Select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+from .search import is_postgres
+from .upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock key, so only one worker refreshes at a time
+REFRESH_LOCK = 720023
+# occupancy rows are written this many at a time
+CHUNK = 5000
+# hosts rebuilt per statement, within SQLite's bound parameter limit
+HOST_CHUNK = 500
+
+
+def _approved():
+    return select(models.Application.res_id).where(models.Application.status == 'approved')
+
+
+def _host_chain(query: Select) -> Select:
+    # invoice -> application -> reservation -> item, for the host
+    return (
+        query.join(models.Application, models.Application.app_id == models.Invoice.app_id)
+        .join(models.Reservation, models.Reservation.res_id == models.Application.res_id)
+        .join(models.Item, models.Item.item_id == models.Reservation.item_id)
+    )
+
+
+# source table -> (its id column, the hosts its new rows affect)
+SOURCES = {
+    'invoice': (models.Invoice.invoice_id, lambda: _host_chain(select(models.Item.owner_id).select_from(models.Invoice))),
+    'payment': (models.Payment.payment_id, lambda: _host_chain(
+        select(models.Item.owner_id).select_from(models.Payment).join(models.Invoice, models.Invoice.invoice_id == models.Payment.invoice_id))),
+    'application': (models.Application.app_id, lambda: (
+        select(models.Item.owner_id).select_from(models.Application)
+        .join(models.Reservation, models.Reservation.res_id == models.Application.res_id)
+        .join(models.Item, models.Item.item_id == models.Reservation.item_id))),
+}
+
+
+def _month(db: AsyncSession, column):
+    if is_postgres(db):
+        return cast(func.date_trunc(literal_column("'month'"), column), Date)
+    return func.date(column, 'start of month')
+
+
+def _month_nights(entry: date, exit: date) -> Iterable[Tuple[date, int]]:
+    # splits the nights of [entry, exit) by calendar month
+    while entry < exit:
+        next_month = (entry.replace(day=1) + timedelta(days=32)).replace(day=1)
+        end = min(exit, next_month)
+        yield entry.replace(day=1), (end - entry).days
+        entry = end
+
+
+async def _rebuild_revenue(db: AsyncSession, host_ids: Optional[List[int]]) -> int:
+    invoices = _host_chain(select(
+        models.Item.owner_id.label('host_id'), _month(db, models.Invoice.date).label('month'),
+        (models.Invoice.status == 'paid').label('paid'),
+        (models.Reservation.final_price - models.Invoice.discount).label('amount'),
+    ).select_from(models.Invoice))
+    if host_ids is not None:
+        invoices = invoices.where(models.Item.owner_id.in_(host_ids))
+    invoices = invoices.subquery()
+    query = select(
+        invoices.c.host_id, invoices.c.month, func.count(), func.sum(case((invoices.c.paid, 1), else_=0)),
+        func.sum(invoices.c.amount), func.sum(case((invoices.c.paid, invoices.c.amount), else_=0)),
+    ).group_by(invoices.c.host_id, invoices.c.month)
+    result = await db.execute(insert(models.HostRevenue).from_select(
+        ['host_id', 'month', 'invoices', 'paid_invoices', 'invoiced_amount', 'paid_amount'], query))
+    return result.rowcount
+
+
+async def _rebuild_occupancy(db: AsyncSession, host_ids: Optional[List[int]]) -> int:
+    query = (
+        select(models.Reservation.item_id, models.Item.owner_id, models.Reservation.entry_date, models.Reservation.exit_date)
+        .join(models.Item, models.Item.item_id == models.Reservation.item_id)
+        .where(models.Reservation.res_id.in_(_approved()))
+    )
+    if host_ids is not None:
+        query = query.where(models.Item.owner_id.in_(host_ids))
+    # (item_id, month) -> [host_id, nights, reservations]
+    totals: Dict[Tuple[int, date], list] = defaultdict(lambda: [0, 0, 0])
+    result = await db.stream(query.execution_options(yield_per=CHUNK))
+    async for item_id, host_id, entry, exit in result:
+        for month, nights in _month_nights(entry, exit):
+            row = totals[item_id, month]
+            row[0] = host_id
+            row[1] += nights
+            row[2] += 1
+    rows = [{"item_id": item_id, "month": month, "host_id": host_id, "booked_nights": nights, "reservations": count}
+            for (item_id, month), (host_id, nights, count) in totals.items()]
+    for start in range(0, len(rows), CHUNK):
+        await db.execute(insert(models.ItemOccupancy), rows[start:start + CHUNK])
+    return len(rows)
+
+
+async def rebuild(db: AsyncSession, host_ids: Optional[Iterable[int]] = None) -> int:
+    """Recomputes the summary rows of the given hosts (all when None) from
+    invoices and reservations. Returns the number of summary rows written;
+    the caller commits."""
+    if host_ids is None:
+        chunks = [None]
+    else:
+        host_ids = sorted(set(host_ids))
+        chunks = [host_ids[start:start + HOST_CHUNK] for start in range(0, len(host_ids), HOST_CHUNK)]
+    written = 0
+    for chunk in chunks:
+        for model in (models.HostRevenue, models.ItemOccupancy):
+            stmt = delete(model)
+            if chunk is not None:
+                stmt = stmt.where(model.host_id.in_(chunk))
+            await db.execute(stmt)
+        written += await _rebuild_revenue(db, chunk)
+        written += await _rebuild_occupancy(db, chunk)
+    return written
+
+
+async def host_revenue(db: AsyncSession, host_id: int, since: Optional[date] = None, until: Optional[date] = None) -> dict:
+    """Invoiced, paid and pending totals per month and overall, read from
+    the summaries."""
+    query = select(models.HostRevenue).where(models.HostRevenue.host_id == host_id).order_by(models.HostRevenue.month)
+    if since is not None:
+        query = query.where(models.HostRevenue.month >= since.replace(day=1))
+    if until is not None:
+        query = query.where(models.HostRevenue.month <= until)
+    months = [{
+        "month": row.month, "invoices": row.invoices, "paid_invoices": row.paid_invoices,
+        "pending_invoices": row.invoices - row.paid_invoices, "invoiced_amount": float(row.invoiced_amount),
+        "paid_amount": float(row.paid_amount), "pending_amount": float(row.invoiced_amount - row.paid_amount),
+    } for row in await db.scalars(query)]
+    totals = {key: sum(month[key] for month in months) for key in
+              ('invoices', 'paid_invoices', 'pending_invoices', 'invoiced_amount', 'paid_amount', 'pending_amount')}
+    return {"host_id": host_id, "totals": totals, "months": months}
+
+
+async def host_occupancy(db: AsyncSession, host_id: int, since: Optional[date] = None, until: Optional[date] = None) -> List[dict]:
+    """Booked nights and occupancy rate per item and month."""
+    query = (
+        select(models.ItemOccupancy).where(models.ItemOccupancy.host_id == host_id)
+        .order_by(models.ItemOccupancy.item_id, models.ItemOccupancy.month)
+    )
+    if since is not None:
+        query = query.where(models.ItemOccupancy.month >= since.replace(day=1))
+    if until is not None:
+        query = query.where(models.ItemOccupancy.month <= until)
+    return [{
+        "item_id": row.item_id, "month": row.month, "booked_nights": row.booked_nights, "reservations": row.reservations,
+        "occupancy_rate": round(row.booked_nights / calendar.monthrange(row.month.year, row.month.month)[1], 4),
+    } for row in await db.scalars(query)]
+
+
+async def hosts_of_renters(db: AsyncSession, user_ids: List[int]) -> List[int]:
+    """Hosts whose summaries include invoices of these renters; deleting
+    the renters has to rebuild them."""
+    result = await db.scalars(
+        select(models.Item.owner_id).distinct()
+        .join(models.Reservation, models.Reservation.item_id == models.Item.item_id)
+        .where(models.Reservation.renter_id.in_(user_ids)))
+    return result.all()
+
+
+async def refresh(db: AsyncSession, full: bool = False, full_interval: float = 0) -> Optional[int]:
+    """Folds invoices, payments and applications added since the last
+    refresh into the summaries by rebuilding just the hosts they belong to.
+    That misses status changes to existing rows, and rows that commit after
+    a higher id was already folded in; a full rebuild, done on the first run
+    and then once `full_interval` seconds have passed since the last one (0:
+    never), picks those up. `full` forces one. Returns the number of summary
+    rows written, or None when another worker holds the refresh. The caller
+    commits."""
+    if is_postgres(db) and not await db.scalar(select(func.pg_try_advisory_xact_lock(REFRESH_LOCK))):
+        return None
+    now = datetime.utcnow()
+    rows = [] if full else (await db.execute(
+        select(models.ReportWatermark.source, models.ReportWatermark.last_id, models.ReportWatermark.rebuilt_at))).all()
+    marks = {source: last_id for source, last_id, _ in rows}
+    rebuilt = [rebuilt_at for _, _, rebuilt_at in rows]
+    if not rows or None in rebuilt or full_interval and now - min(rebuilt) >= timedelta(seconds=full_interval):
+        marks = {}
+    hosts, new_marks = set(), {}
+    for source, (id_column, affected_hosts) in SOURCES.items():
+        last = marks.get(source, 0)
+        # a fixed upper bound, so rows inserted meanwhile wait for the next run
+        top = await db.scalar(select(func.max(id_column)))
+        if top is None or top <= last:
+            continue
+        if marks:
+            hosts.update(await db.scalars(affected_hosts().where(id_column > last, id_column <= top).distinct()))
+        new_marks[source] = top
+    if marks:
+        if not new_marks:
+            return 0
+        refreshed = await rebuild(db, hosts)
+        rows = [{"source": source, "last_id": last_id} for source, last_id in new_marks.items()]
+    else:
+        # everything in one pass
+        refreshed = await rebuild(db)
+        rows = [{"source": source, "last_id": last_id, "rebuilt_at": now} for source, last_id in new_marks.items()]
+    if not rows:
+        return refreshed
+    stmt = dialect_insert(db, models.ReportWatermark).values(rows)
+    await db.execute(stmt.on_conflict_do_update(index_elements=[models.ReportWatermark.source],
+                                                set_={column: stmt.excluded[column] for column in rows[0] if column != "source"}))
+    return refreshed
+
+
+class Refresher:
+    """Runs refresh() every `interval` seconds in the background, with a
+    full rebuild every `full_interval` seconds."""
+
+    def __init__(self, sessionmaker: async_sessionmaker, interval: float, full_interval: float = 0):
+        self.sessionmaker = sessionmaker
+        self.interval = interval
+        self.full_interval = full_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                async with self.sessionmaker() as db:
+                    await refresh(db, full_interval=self.full_interval)
+                    await db.commit()
+            except Exception:
+                logger.exception('report refresh failed')
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Dict, List, Optional
 from datetime import date, time
 
 class UserBase(BaseModel):
@@ -16,14 +16,64 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     pass
 
-class UserUpdate(UserBase):
-    pass
+class UserUpdate(BaseModel):
+    """The fields to change; those left out keep their values."""
+    phone: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    national_code: Optional[str] = None
+    gender: Optional[str] = None
+    date_of_birth: Optional[date] = None
+    email: Optional[str] = None
+    home_phone: Optional[str] = None
+    description: Optional[str] = None
+
+    # these can be left out, but not cleared: their columns are NOT NULL
+    @field_validator('first_name', 'last_name', 'national_code', 'gender', 'date_of_birth', 'email')
+    @classmethod
+    def _not_null(cls, value):
+        if value is None:
+            raise ValueError('may be left out but not null')
+        return value
+
+class UserBulkUpdate(UserUpdate):
+    user_id: int
+
+class BulkUpdateResult(BaseModel):
+    updated: List[int]
+    missing: List[int]
 
 class UserModel(UserBase):
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class UserPage(BaseModel):
+    items: List[UserModel]
+    next_cursor: Optional[str] = None
+
+class PurgeUsers(BaseModel):
+    user_ids: List[int]
+    background: bool = False
+
+class PurgeResult(BaseModel):
+    deleted: List[int]
+
+class ImportReport(BaseModel):
+    kind: str
+    rows: int
+    inserted: int
+    failed: int
+    seconds: float
+    rows_per_second: float
+    batches: List[dict]
+
+class Job(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
 
 class Token(BaseModel):
     access_token: str
@@ -48,45 +98,70 @@ class ItemCreate(ItemBase):
 class Item(ItemBase):
     item_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class ItemPrice(BaseModel):
+    item_id: int
+    price: float
+
+class ItemNear(Item):
+    distance_km: float
+
+class ItemNearPage(BaseModel):
+    items: List[ItemNear]
+    next_cursor: Optional[str] = None
+
+class ItemPage(BaseModel):
+    items: List[Item]
+    next_cursor: Optional[str] = None
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class ItemSearchPage(ItemPage):
+    # per facet (state, city, type, price, capacity), when asked for
+    facets: Optional[Dict[str, List[FacetCount]]] = None
 
 class TypeList(BaseModel):
     type_list_id: int
     name: Optional[str]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Type(BaseModel):
     type_id: int
     item_id: int
     type_list_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class LocationBase(BaseModel):
     state: str
     city: str
     exact_loc: str
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class Location(LocationBase):
     location_id: int
     item_id: int
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 class LocationCreate(LocationBase):
-    pass
+    item_id: int
 
-class Feature(BaseModel):
-    feature_id: int
+class FeatureBase(BaseModel):
     item_id: int
     name: str
-    more_detail: Optional[str]
+    more_detail: Optional[str] = None
 
-    class Config:
-        orm_mode = True
+class FeatureCreate(FeatureBase):
+    pass
+
+class Feature(FeatureBase):
+    feature_id: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 class OpenClose(BaseModel):
     open_close_id: int
@@ -94,8 +169,7 @@ class OpenClose(BaseModel):
     close_time: time
     item_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Rule(BaseModel):
     rule_id: int
@@ -103,8 +177,7 @@ class Rule(BaseModel):
     name: str
     value: bool
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Rating(BaseModel):
     rating_id: int
@@ -112,8 +185,7 @@ class Rating(BaseModel):
     total_rate: int
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Rate(BaseModel):
     rate_id: int
@@ -122,19 +194,32 @@ class Rate(BaseModel):
     item_id: int
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class RateScore(BaseModel):
+    rate_title: str
+    rate: int
+
+class RatingCreate(BaseModel):
+    # the rater is the caller
+    item_id: int
+    total_rate: int
+    rates: List[RateScore] = []
+
+class ItemRatingSummary(BaseModel):
+    item_id: int
+    rating_count: int
+    rating: Optional[float] = None
+    criteria: Dict[str, float]
 
 class Property(BaseModel):
     property_id: int
     item_id: int
     status: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
-class ItemDescription(BaseModel):
-    item_desc_id: int
+class ItemDescriptionBase(BaseModel):
     item_id: int
     capacity: int
     room: int
@@ -145,8 +230,13 @@ class ItemDescription(BaseModel):
     persian_wc: int
     caption: str
 
-    class Config:
-        orm_mode = True
+class ItemDescriptionCreate(ItemDescriptionBase):
+    pass
+
+class ItemDescription(ItemDescriptionBase):
+    item_desc_id: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Message(BaseModel):
     message_id: int
@@ -155,15 +245,36 @@ class Message(BaseModel):
     item_id: int
     text: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class MessageCreate(BaseModel):
+    receiver_id: int
+    item_id: int
+    text: str
+
+class MessagePage(BaseModel):
+    items: List[Message]
+    next_cursor: Optional[str] = None
+
+class Conversation(BaseModel):
+    counterpart_id: int
+    item_id: int
+    message_count: int
+    last_message: Message
+
+class ConversationPage(BaseModel):
+    items: List[Conversation]
+    next_cursor: Optional[str] = None
 
 class Like(BaseModel):
     user_id: int
     item_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class FavoritesBulk(BaseModel):
+    user_id: int
+    item_ids: List[int] = Field(min_length=1, max_length=500)
 
 class CommentSection(BaseModel):
     comment_id: int
@@ -171,11 +282,9 @@ class CommentSection(BaseModel):
     user_id: int
     comment: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
-class Reservation(BaseModel):
-    res_id: int
+class ReservationBase(BaseModel):
     renter_id: int
     item_id: int
     entry_date: date
@@ -183,16 +292,20 @@ class Reservation(BaseModel):
     passengers_number: int
     final_price: float
 
-    class Config:
-        orm_mode = True
+class ReservationCreate(ReservationBase):
+    pass
+
+class Reservation(ReservationBase):
+    res_id: int
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Application(BaseModel):
     app_id: int
     res_id: int
     status: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Invoice(BaseModel):
     invoice_id: int
@@ -202,20 +315,56 @@ class Invoice(BaseModel):
     discount: float
     status: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class Payment(BaseModel):
     payment_id: int
     invoice_id: int
     date: date
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class InvoiceLine(BaseModel):
     invoice_line_id: int
     payment_id: int
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class ItemFull(Item):
+    locations: List[Location]
+    descriptions: List[ItemDescription]
+    features: List[Feature]
+    rules: List[Rule]
+    open_close: List[OpenClose]
+    type_lists: List[TypeList]
+    ratings: List[Rating]
+    comments: List[CommentSection]
+
+class HostRevenueMonth(BaseModel):
+    month: date
+    invoices: int
+    paid_invoices: int
+    pending_invoices: int
+    invoiced_amount: float
+    paid_amount: float
+    pending_amount: float
+
+class HostRevenueTotals(BaseModel):
+    invoices: int
+    paid_invoices: int
+    pending_invoices: int
+    invoiced_amount: float
+    paid_amount: float
+    pending_amount: float
+
+class HostReport(BaseModel):
+    host_id: int
+    totals: HostRevenueTotals
+    months: List[HostRevenueMonth]
+
+class ItemOccupancy(BaseModel):
+    item_id: int
+    month: date
+    booked_nights: int
+    reservations: int
+    occupancy_rate: float
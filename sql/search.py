@@ -0,0 +1,208 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, delete, insert, func, cast, case, or_, literal, literal_column, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .database import owner
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TS_CONFIG = literal_column("'simple'")
+# word_similarity threshold used by pg_trgm's <% operator is set server side
+# (pg_trgm.word_similarity_threshold); the fallback index uses its own
+FUZZY_THRESHOLD = 0.4
+# the fallback ranks only the best this many matches of a query, since they go
+# to the database as an IN list and a CASE of literals; paging past them ends
+# the results, where Postgres would go on
+FALLBACK_LIMIT = 1000
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_document(item: models.Item, locations: List[models.Location]) -> str:
+    parts = [item.name, item.about]
+    for location in locations:
+        parts.extend([location.state, location.city])
+    return ' '.join(part for part in parts if part)
+
+
+class FallbackIndex:
+    """In-process inverted index used when the database has no full-text
+    support (SQLite test runs). Matches each query term exactly, by prefix or
+    by trigram similarity, and ranks documents by the summed match weights."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs: Dict[int, Set[str]] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._vocab: List[str] = []
+
+    def add(self, item_id: int, document: str):
+        with self._lock:
+            self._remove(item_id)
+            tokens = set(tokenize(document))
+            self._docs[item_id] = tokens
+            for token in tokens:
+                if token not in self._postings:
+                    insort(self._vocab, token)
+                    for gram in trigrams(token):
+                        self._grams[gram].add(token)
+                self._postings[token].add(item_id)
+
+    def remove(self, item_id: int):
+        with self._lock:
+            self._remove(item_id)
+
+    def _remove(self, item_id: int):
+        for token in self._docs.pop(item_id, ()):
+            postings = self._postings[token]
+            postings.discard(item_id)
+            if not postings:
+                del self._postings[token]
+                self._vocab.pop(bisect_left(self._vocab, token))
+                for gram in trigrams(token):
+                    self._grams[gram].discard(token)
+
+    def _expand(self, term: str) -> Dict[str, float]:
+        weights = {}
+        for token, similarity in self._fuzzy(term):
+            weights[token] = 0.6 * similarity
+        start = bisect_left(self._vocab, term)
+        for token in self._vocab[start:]:
+            if not token.startswith(term):
+                break
+            weights[token] = 0.8
+        if term in self._postings:
+            weights[term] = 1.0
+        return weights
+
+    def _fuzzy(self, term: str) -> List[Tuple[str, float]]:
+        term_grams = trigrams(term)
+        shared = defaultdict(int)
+        for gram in term_grams:
+            for token in self._grams.get(gram, ()):
+                shared[token] += 1
+        matches = []
+        for token, count in shared.items():
+            similarity = count / len(term_grams | trigrams(token))
+            if similarity >= FUZZY_THRESHOLD:
+                matches.append((token, similarity))
+        return matches
+
+    def search(self, q: str, limit: int = FALLBACK_LIMIT) -> List[Tuple[int, float]]:
+        terms = tokenize(q)
+        if not terms:
+            return []
+        with self._lock:
+            scores: Optional[Dict[int, float]] = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token, weight in self._expand(term).items():
+                    for item_id in self._postings[token]:
+                        term_scores[item_id] = max(term_scores[item_id], weight)
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {item_id: score + term_scores[item_id] for item_id, score in scores.items() if item_id in term_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return ranked[:limit]
+
+
+def is_postgres(db: AsyncSession) -> bool:
+    return db.bind.dialect.name == 'postgresql'
+
+
+async def fallback_index(db: AsyncSession) -> FallbackIndex:
+    """The FallbackIndex of the Database `db` belongs to, loaded from
+    item_search on first use."""
+    database = owner(db)
+    if database.search_index is None:
+        index = FallbackIndex()
+        rows = await db.execute(select(models.ItemSearch.item_id, models.ItemSearch.document))
+        for item_id, document in rows:
+            index.add(item_id, document)
+        database.search_index = index
+    return database.search_index
+
+
+async def owned_items(db: AsyncSession, user_ids: Iterable[int]) -> List[int]:
+    """Ids of the items of `user_ids` with an entry in the fallback index,
+    which deleting the users cascades to; none on Postgres."""
+    if is_postgres(db) or owner(db).search_index is None:
+        return []
+    return list(await db.scalars(select(models.Item.item_id).where(models.Item.owner_id.in_(user_ids))))
+
+
+def unindex_items(db: AsyncSession, item_ids: Iterable[int]):
+    """Drops deleted items from the fallback index."""
+    index = owner(db).search_index
+    if index is not None:
+        for item_id in item_ids:
+            index.remove(item_id)
+
+
+async def index_item(db: AsyncSession, item: models.Item):
+    locations = await db.scalars(select(models.Location).where(models.Location.item_id == item.item_id))
+    document = build_document(item, locations.all())
+    await db.merge(models.ItemSearch(item_id=item.item_id, document=document))
+    index = owner(db).search_index
+    if index is not None:
+        index.add(item.item_id, document)
+
+
+async def reindex_items(db: AsyncSession, item_ids: Iterable[int]):
+    # batch variant of index_item: a fixed number of statements per call
+    item_ids = sorted(set(item_ids))
+    if not item_ids:
+        return
+    items = (await db.scalars(select(models.Item).where(models.Item.item_id.in_(item_ids)))).all()
+    locations = defaultdict(list)
+    for location in await db.scalars(select(models.Location).where(models.Location.item_id.in_(item_ids))):
+        locations[location.item_id].append(location)
+    documents = [{"item_id": item.item_id, "document": build_document(item, locations[item.item_id])} for item in items]
+    await db.execute(delete(models.ItemSearch).where(models.ItemSearch.item_id.in_(item_ids)))
+    if documents:
+        await db.execute(insert(models.ItemSearch), documents)
+    index = owner(db).search_index
+    if index is not None:
+        for document in documents:
+            index.add(document["item_id"], document["document"])
+
+
+def prefix_tsquery(q: str) -> Optional[str]:
+    terms = tokenize(q)
+    if not terms:
+        return None
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+async def ranked(db: AsyncSession, q: str):
+    """Returns a subquery of (item_id, relevance) for items matching `q`."""
+    if is_postgres(db):
+        document = models.ItemSearch.document
+        tsvector = func.to_tsvector(TS_CONFIG, document)
+        tsquery = func.to_tsquery(TS_CONFIG, prefix_tsquery(q) or '')
+        relevance = cast(func.ts_rank(tsvector, tsquery), Float) + cast(func.word_similarity(q, document), Float)
+        return select(
+            models.ItemSearch.item_id.label('item_id'), relevance.label('relevance')
+        ).where(or_(tsvector.op('@@')(tsquery), literal(q).op('<%')(document))).subquery('ranked')
+
+    scores = dict((await fallback_index(db)).search(q))
+    relevance = case(scores, value=models.Item.item_id, else_=0.0) if scores else literal_column('0.0')
+    return select(
+        models.Item.item_id.label('item_id'), cast(relevance, Float).label('relevance')
+    ).where(models.Item.item_id.in_(list(scores))).subquery('ranked')
@@ -0,0 +1,23 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def adapter(tp) -> TypeAdapter:
+    # building a TypeAdapter compiles its validator/serializer; do it once per type
+    return TypeAdapter(tp)
+
+
+def dump_json(tp, value: Any) -> bytes:
+    """Validates ORM objects (or dicts of them) against `tp` and serializes the
+    result to JSON bytes, both in pydantic-core."""
+    type_adapter = adapter(tp)
+    return type_adapter.dump_json(type_adapter.validate_python(value, from_attributes=True))
+
+
+def json_response(tp, value: Any, status_code: int = 200) -> Response:
+    # returning a Response skips FastAPI's second response_model validation pass
+    return Response(content=dump_json(tp, value), status_code=status_code, media_type='application/json')
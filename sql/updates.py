@@ -0,0 +1,72 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, values, column, bindparam, cast
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .search import is_postgres
+
+# rows per UPDATE statement
+BATCH_SIZE = 1000
+
+
+def _primary_key(model):
+    return model.__table__.primary_key.columns.values()[0]
+
+
+async def update_row(db: AsyncSession, model, key, changes: dict) -> Optional[object]:
+    """Applies `changes` to the row with primary key `key` in a single
+    UPDATE ... RETURNING; returns the updated row, or None if there is no
+    such row. The caller commits."""
+    pk = _primary_key(model)
+    if not changes:
+        return await db.get(model, key)
+    stmt = (
+        update(model).where(pk == key).values(**changes).returning(model)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return await db.scalar(stmt)
+
+
+async def _update_batch(db: AsyncSession, table, pk, columns: Tuple[str, ...], rows: List[dict]) -> List:
+    if is_postgres(db):
+        # UPDATE ... FROM (VALUES ...) AS v: the whole batch in one statement
+        v = values(*[column(name, table.c[name].type) for name in (pk.name, *columns)], name='v').data(
+            [tuple(row[name] for name in (pk.name, *columns)) for row in rows])
+        # None is sent as an untyped NULL; the cast keeps an all-NULL column
+        # from being read as text
+        changes = {name: cast(v.c[name], table.c[name].type) for name in columns}
+        stmt = update(table).where(pk == v.c[pk.name]).values(changes).returning(pk)
+        return (await db.execute(stmt)).scalars().all()
+    # SQLite can't alias VALUES columns; one executemany instead, after
+    # finding which of the keys exist
+    keys = [row[pk.name] for row in rows]
+    found = (await db.execute(select(pk).where(pk.in_(keys)))).scalars().all()
+    stmt = update(table).where(pk == bindparam('_key')).values({name: bindparam(name) for name in columns})
+    await db.execute(stmt, [{"_key": row[pk.name], **{name: row[name] for name in columns}} for row in rows])
+    return found
+
+
+async def update_many(db: AsyncSession, model, rows: List[dict]) -> Tuple[List, List]:
+    """Applies many partial updates, each a dict of the primary key plus
+    the columns to change, with one statement per batch of rows that change
+    the same columns. A patch with nothing to change counts as updated if
+    its row exists. Returns (updated keys, keys with no row); the caller
+    commits."""
+    table = model.__table__
+    pk = _primary_key(model)
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    unchanged = []
+    for row in rows:
+        columns = tuple(sorted(name for name in row if name != pk.name))
+        if columns:
+            groups.setdefault(columns, []).append(row)
+        else:
+            unchanged.append(row[pk.name])
+    updated = set()
+    for start in range(0, len(unchanged), BATCH_SIZE):
+        updated.update(await db.scalars(select(pk).where(pk.in_(unchanged[start:start + BATCH_SIZE]))))
+    for columns, group in groups.items():
+        for start in range(0, len(group), BATCH_SIZE):
+            updated.update(await _update_batch(db, table, pk, columns, group[start:start + BATCH_SIZE]))
+    requested = list(dict.fromkeys(row[pk.name] for row in rows))
+    return [key for key in requested if key in updated], [key for key in requested if key not in updated]
@@ -0,0 +1,29 @@
+from typing import Iterable, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .search import is_postgres
+
+
+def dialect_insert(db: AsyncSession, model):
+    # INSERT with ON CONFLICT support; both dialects share its interface
+    return (postgresql.insert if is_postgres(db) else sqlite.insert)(model)
+
+
+async def insert_new(db: AsyncSession, model, values: dict, conflict: Iterable) -> Optional[object]:
+    """Inserts a row in one statement unless it would collide on the unique
+    `conflict` columns; returns the new row, or None for a duplicate. Unlike
+    a SELECT first, this holds up against a concurrent insert of the same
+    key. The caller commits."""
+    stmt = dialect_insert(db, model).values(**values).on_conflict_do_nothing(index_elements=list(conflict))
+    return await db.scalar(stmt.returning(model))
+
+
+async def insert_new_many(db: AsyncSession, model, rows: List[dict], conflict: Iterable) -> list:
+    """insert_new for many rows at once; returns only the rows that were
+    actually inserted."""
+    if not rows:
+        return []
+    stmt = dialect_insert(db, model).values(rows).on_conflict_do_nothing(index_elements=list(conflict))
+    return (await db.scalars(stmt.returning(model))).all()
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from benchmarks import datagen
+from sql import auth, database, models
+from sql.settings import Settings
+
+# rows generated for the test database; datagen makes about one house per 36
+ROWS = 2000
+
+
+async def _seed(db: database.Database):
+    await datagen.generate(db.async_session_factory, ROWS, seed=7)
+    # the pool's connections belong to this event loop, not the app's
+    await db.async_engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The app on a seeded SQLite database of its own."""
+    # every request reaches the database
+    settings = Settings(database_url=f'sqlite:///{tmp_path_factory.mktemp("db") / "test.db"}',
+                        pool_prewarm=0, report_refresh_interval=0, response_cache_size=0,
+                        admin_token='test-admin')
+    app = main.create_app(settings)
+    db = app.state.database
+    database.Base.metadata.create_all(db.engine)
+    asyncio.run(_seed(db))
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def statements(app):
+    """The SQL statements the app runs during the test."""
+    executed = []
+    engine = app.state.database.async_engine.sync_engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def login(app):
+    """The token header of a user of the test database."""
+    def headers(user_id):
+        with app.state.database.session_factory() as db:
+            email = db.get(models.USER, user_id).email
+        return {'token': auth.create_access_token({'sub': email}, app.state.settings.secret_key)}
+    return headers
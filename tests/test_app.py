@@ -0,0 +1,34 @@
+from dataclasses import replace
+
+from fastapi.testclient import TestClient
+
+import main
+from sql.settings import Settings
+
+
+def test_apps_keep_their_own_database(app, client, tmp_path):
+    settings = Settings(database_url=f'sqlite:///{tmp_path / "other.db"}', pool_prewarm=0, report_refresh_interval=0)
+    other = main.create_app(settings)
+
+    assert other.state.database is not app.state.database
+    # creating the app doesn't create engines
+    assert 'async_engine' not in other.state.database.__dict__
+    with TestClient(other) as other_client:
+        assert other_client.get('/health/db').json()['status'] == 'ok'
+    assert str(other.state.database.async_engine.url).endswith('other.db')
+    # the first app still serves from its own
+    assert client.get('/houses/full?ids=1').status_code == 200
+    assert app.state.database.settings.database_url != settings.database_url
+
+
+def test_apps_keep_their_own_admin_token_and_signing_key(app, client, login):
+    other = main.create_app(replace(app.state.settings, admin_token='other-admin', secret_key='other-secret'))
+    token = login(1)
+
+    with TestClient(other) as other_client:
+        assert other_client.patch('/users', headers={'admin-token': 'other-admin'}, json=[]).status_code == 200
+        assert other_client.patch('/users', headers={'admin-token': 'test-admin'}, json=[]).status_code == 403
+        # a token signed by the first app doesn't log in to the other
+        assert other_client.get('/loged-user', headers=token).status_code == 401
+    assert client.patch('/users', headers={'admin-token': 'test-admin'}, json=[]).status_code == 200
+    assert client.get('/loged-user', headers=token).status_code == 200
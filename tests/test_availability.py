@@ -0,0 +1,43 @@
+import asyncio
+from datetime import date
+
+from sql import availability
+
+ENTRY, EXIT = date(2090, 1, 1), date(2090, 1, 5)
+
+
+def _booked(app):
+    return app.state.database.reservation_tree.overlapping(ENTRY, EXIT)
+
+
+def _reservation(item_id):
+    return {'renter_id': 2, 'item_id': item_id, 'entry_date': ENTRY.isoformat(), 'exit_date': EXIT.isoformat(),
+            'passengers_number': 1, 'final_price': 10}
+
+
+def test_committed_bookings_reach_the_tree(app, client):
+    assert client.get('/houses/available', params={'entry': ENTRY, 'exit': EXIT}).status_code == 200
+    assert 3 not in _booked(app)
+
+    assert client.post('/reservations', json=_reservation(3)).status_code == 200
+    assert 3 in _booked(app)
+
+
+def test_rolled_back_bookings_dont(app, client):
+    client.get('/houses/available', params={'entry': ENTRY, 'exit': EXIT})
+    database = app.state.database
+
+    async def book_and_roll_back():
+        async with database.async_session_factory() as db:
+            reservation = {**_reservation(4), 'entry_date': ENTRY, 'exit_date': EXIT}
+            assert await availability.book(db, reservation) is not None
+            await db.rollback()
+        # the pool's connections belong to this event loop, not the app's
+        await database.async_engine.dispose()
+
+    asyncio.run(book_and_roll_back())
+    assert 4 not in _booked(app)
+    # nor is it in the table, so a fresh tree agrees
+    database.reservation_tree = None
+    client.get('/houses/available', params={'entry': ENTRY, 'exit': EXIT})
+    assert 4 not in _booked(app)
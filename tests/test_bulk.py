@@ -0,0 +1,23 @@
+ADMIN = {'admin-token': 'test-admin'}
+
+
+def test_lines_that_arent_utf8_are_reported_like_other_bad_rows(client):
+    body = b'{"name": "caf\xe9"}\nnot json\n'
+    response = client.post('/bulk/features?format=ndjson', headers=ADMIN, content=body)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report['rows'], report['inserted'], report['failed']) == (2, 0, 2)
+    errors = report['batches'][0]['errors']
+    assert errors[0] == {'line': 1, 'error': 'invalid UTF-8 at byte 13'}
+    assert errors[1]['line'] == 2 and errors[1]['error'].startswith('invalid JSON')
+
+
+def test_multibyte_characters_split_across_chunks_decode(client):
+    # the bad item_id keeps the row out of the shared test database
+    def chunks():
+        yield b'item_id,name\nnone,caf\xc3'
+        yield b'\xa9\n'
+
+    response = client.post('/bulk/features?format=csv', headers=ADMIN, content=chunks())
+    [error] = response.json()['batches'][0]['errors']
+    assert error['line'] == 2 and error['error'].startswith('item_id')
@@ -0,0 +1,75 @@
+import json
+import os
+from contextlib import ExitStack
+
+import pytest
+from sqlalchemy import text
+
+from sql import database
+from sql.settings import Settings
+
+POOL_SIZE = 2
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = database.Database(Settings(database_url=f'sqlite:///{tmp_path / "fork.db"}', pool_size=POOL_SIZE, max_overflow=0))
+    yield db
+    db.engine.dispose()
+
+
+def _check_out(db):
+    """Checks out the whole pool at once and returns, for each connection,
+    the DBAPI connection's id and the pid that opened it."""
+    with ExitStack() as stack:
+        connections = [stack.enter_context(db.engine.connect()) for _ in range(POOL_SIZE)]
+        for conn in connections:
+            assert conn.scalar(text('SELECT 1')) == 1
+        return {(id(conn.connection.dbapi_connection), conn.connection.info['pid']) for conn in connections}
+
+
+def _in_child(db):
+    """Forks; the child checks out the pool and reports what it got. The
+    parent returns that."""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            report = {"pids": sorted(pid for _, pid in _check_out(db)), "pid": os.getpid(), "pool": id(db.engine.pool)}
+        except Exception as e:
+            report, status = {"error": repr(e)}, 1
+        os.write(write, json.dumps(report).encode())
+        os._exit(status)
+    os.close(write)
+    with os.fdopen(read) as pipe:
+        report = json.loads(pipe.read())
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0, report
+    return report
+
+
+def test_child_opens_its_own_connections(db):
+    parent = _check_out(db)
+    assert {pid for _, pid in parent} == {os.getpid()}
+
+    child = _in_child(db)
+
+    # the after_fork hook gave the child an empty pool
+    assert child["pool"] != id(db.engine.pool)
+    assert child["pids"] == [child["pid"]] * POOL_SIZE
+    # and left the parent's connections open and pooled
+    assert _check_out(db) == parent
+
+
+def test_pid_check_replaces_inherited_connections(db, monkeypatch):
+    parent = _check_out(db)
+    # without the hook the child inherits the parent's pool as it is
+    monkeypatch.setattr(database, '_databases', set())
+
+    child = _in_child(db)
+
+    # the checkout pid check discarded each inherited connection for a new one
+    assert child["pool"] == id(db.engine.pool)
+    assert child["pids"] == [child["pid"]] * POOL_SIZE
+    assert _check_out(db) == parent
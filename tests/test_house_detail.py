@@ -0,0 +1,26 @@
+import pytest
+
+import main
+
+# the house, then one SELECT ... IN per eagerly loaded collection
+DETAIL_QUERIES = 1 + len(main.ITEM_DETAIL_OPTIONS)
+
+
+def test_house_full_query_count(client, statements):
+    response = client.get('/houses/1/full')
+    assert response.status_code == 200
+    assert response.json()["locations"]
+    assert len(statements) == DETAIL_QUERIES
+
+
+@pytest.mark.parametrize('count', [1, 2, 25])
+def test_houses_full_query_count_does_not_grow(client, statements, count):
+    ids = list(range(1, count + 1))
+    response = client.get('/houses/full', params={'ids': ids})
+    assert response.status_code == 200
+    assert [house["item_id"] for house in response.json()] == ids
+    assert len(statements) == DETAIL_QUERIES
+
+
+def test_house_full_not_found(client):
+    assert client.get('/houses/999999/full').status_code == 404
@@ -0,0 +1,58 @@
+from sqlalchemy import func, select
+
+from sql import models
+
+
+def _rater(app):
+    """Two users and an item of the test database."""
+    with app.state.database.session_factory() as db:
+        first, second = db.scalars(select(models.USER.user_id).order_by(models.USER.user_id).limit(2)).all()
+        item_id = db.scalar(select(models.Item.item_id).order_by(models.Item.item_id).limit(1))
+        return first, second, item_id
+
+
+def _rate_count(app, rating_id):
+    with app.state.database.session_factory() as db:
+        return db.scalar(select(func.count()).select_from(models.Rate).where(models.Rate.rating_id == rating_id))
+
+
+def _rate(client, headers, item_id):
+    response = client.post('/ratings', headers=headers, json={'item_id': item_id, 'total_rate': 4,
+                                                              'rates': [{'rate_title': 'Cleanliness', 'rate': 4}]})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_rating_is_by_the_caller(app, client, login):
+    user_id, _, item_id = _rater(app)
+
+    assert client.post('/ratings', json={'item_id': item_id, 'total_rate': 4}).status_code == 422
+    # a user_id in the body is ignored
+    rating = client.post('/ratings', headers=login(user_id), json={'item_id': item_id, 'user_id': 0, 'total_rate': 4}).json()
+    assert rating['user_id'] == user_id
+
+
+def test_delete_rating_keeps_rates_of_other_ratings(app, client, login):
+    user_id, _, item_id = _rater(app)
+    headers = login(user_id)
+    first, second = _rate(client, headers, item_id)['rating_id'], _rate(client, headers, item_id)['rating_id']
+
+    response = client.delete(f'/ratings/{first}', headers=headers)
+
+    assert response.status_code == 200
+    assert _rate_count(app, first) == 0
+    assert _rate_count(app, second) == 1
+
+
+def test_delete_rating_needs_its_author(app, client, login):
+    user_id, other, item_id = _rater(app)
+    rating_id = _rate(client, login(other), item_id)['rating_id']
+
+    assert client.delete(f'/ratings/{rating_id}').status_code == 422
+    assert client.delete(f'/ratings/{rating_id}', headers=login(user_id)).status_code == 403
+    assert _rate_count(app, rating_id) == 1
+
+
+def test_delete_rating_not_found(app, client, login):
+    user_id, _, _ = _rater(app)
+    assert client.delete('/ratings/0', headers=login(user_id)).status_code == 404
@@ -0,0 +1,49 @@
+import asyncio
+import time
+from dataclasses import replace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from sql.replicas import WROTE_AT_COOKIE
+
+
+@pytest.fixture
+def replicated(app):
+    """An app on the test database with that same database as its replica."""
+    settings = app.state.settings
+    return main.create_app(replace(settings, replica_database_urls=(settings.database_url,)))
+
+
+def _write(client, headers):
+    return client.post('/ratings', headers=headers, json={'item_id': 1, 'total_rate': 5})
+
+
+def test_write_sets_a_signed_wrote_at_cookie(replicated, login):
+    router = replicated.state.database.read_router
+    with TestClient(replicated) as client:
+        assert WROTE_AT_COOKIE not in client.get('/houses/full?ids=1').cookies
+        stamp = _write(client, login(1)).cookies[WROTE_AT_COOKIE]
+
+    assert router.is_sticky(stamp)
+    signature = stamp.rpartition('.')[2]
+    assert not router.is_sticky(f'{time.time() + 3600:.3f}.{signature}')
+    assert not router.is_sticky(router.stamp(time.time() - router.sticky_seconds - 1))
+
+
+def test_reads_after_a_write_go_to_the_primary(replicated):
+    database = replicated.state.database
+    router = database.read_router
+
+    async def bind(stamp):
+        async with await router.session(stamp) as db:
+            return db.bind
+
+    assert asyncio.run(bind(None)) is database.replica_engines[0]
+    assert asyncio.run(bind(router.stamp(time.time()))) is database.async_engine
+    asyncio.run(database.dispose())
+
+
+def test_no_cookie_without_replicas(client, login):
+    assert WROTE_AT_COOKIE not in _write(client, login(1)).cookies
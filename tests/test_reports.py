@@ -0,0 +1,43 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from sql import database, models, reports
+
+
+async def _paid_invoices(db):
+    return await db.scalar(select(func.sum(models.HostRevenue.paid_invoices)))
+
+
+async def _check_status_changes(db_settings):
+    db = database.Database(db_settings)
+    try:
+        async with db.async_session_factory() as session:
+            await reports.refresh(session, full=True)
+            await session.commit()
+            paid = await _paid_invoices(session)
+            invoice_id = await session.scalar(select(func.min(models.Invoice.invoice_id)).where(models.Invoice.status == 'unpaid'))
+            await session.execute(update(models.Invoice).where(models.Invoice.invoice_id == invoice_id).values(status='paid'))
+            await session.commit()
+
+            # the status change has no new id, so a refresh doesn't see it
+            assert await reports.refresh(session, full_interval=3600) == 0
+            assert await _paid_invoices(session) == paid
+
+            # until a full rebuild is due
+            await session.execute(update(models.ReportWatermark).values(rebuilt_at=datetime.utcnow() - timedelta(hours=1)))
+            assert await reports.refresh(session, full_interval=3600) > 0
+            assert await _paid_invoices(session) == paid + 1
+            rebuilt = await session.scalars(select(models.ReportWatermark.rebuilt_at))
+            assert all(datetime.utcnow() - rebuilt_at < timedelta(minutes=1) for rebuilt_at in rebuilt)
+
+            await session.execute(update(models.Invoice).where(models.Invoice.invoice_id == invoice_id).values(status='unpaid'))
+            await reports.refresh(session, full=True)
+            await session.commit()
+    finally:
+        await db.dispose()
+
+
+def test_full_rebuild_picks_up_status_changes(app):
+    asyncio.run(_check_status_changes(app.state.database.settings))
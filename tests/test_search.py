@@ -0,0 +1,49 @@
+from dataclasses import replace
+
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.datagen import user_row
+from sql import database, search
+from sql.settings import async_url
+
+
+def _search(client, q):
+    response = client.get('/houses/', params={'q': q})
+    assert response.status_code == 200
+    return [house['item_id'] for house in response.json()['items']]
+
+
+def test_purged_houses_leave_the_fallback_index(app, client, login):
+    user = user_row(900001)
+    del user['user_id']
+    user['date_of_birth'] = user['date_of_birth'].isoformat()
+    user_id = client.post('/register/user', json=user).json()['user_id']
+    house = client.post('/create-house', json={'owner_id': user_id, 'name': 'Quillfeather lodge', 'price': 10, 'about': None}).json()
+    assert _search(client, 'quillfeather') == [house['item_id']]
+
+    assert client.delete('/delete-user', headers=login(user_id)).status_code == 200
+    assert _search(client, 'quillfeather') == []
+    assert app.state.database.search_index.search('quillfeather lodge') == []
+
+
+def test_apps_keep_their_own_fallback_index(app, client, tmp_path):
+    assert _search(client, 'villa')
+    url = f'sqlite:///{tmp_path / "other.db"}'
+    other = main.create_app(replace(app.state.settings, database_url=url, async_database_url=async_url(url)))
+    database.Base.metadata.create_all(other.state.database.engine)
+
+    with TestClient(other) as other_client:
+        assert _search(other_client, 'villa') == []
+    assert other.state.database.search_index is not app.state.database.search_index
+
+
+def test_fallback_ranks_at_most_the_limit():
+    index = search.FallbackIndex()
+    for item_id in range(1, search.FALLBACK_LIMIT + 11):
+        index.add(item_id, 'cabin')
+
+    # equal scores rank by id
+    ranked = index.search('cabin')
+    assert len(ranked) == search.FALLBACK_LIMIT
+    assert [item_id for item_id, _ in ranked] == list(range(1, search.FALLBACK_LIMIT + 1))
@@ -0,0 +1,58 @@
+from sqlalchemy import select
+
+from sql import models
+
+# the admin token of the test app
+ADMIN = {'admin-token': 'test-admin'}
+
+
+def _user(app, user_id):
+    with app.state.database.session_factory() as db:
+        return db.get(models.USER, user_id)
+
+
+def _user_ids(app, count):
+    with app.state.database.session_factory() as db:
+        return db.scalars(select(models.USER.user_id).order_by(models.USER.user_id).limit(count)).all()
+
+
+def test_patch_users_changes_only_the_fields_sent(app, client):
+    first, second = _user_ids(app, 2)
+    before = _user(app, second)
+
+    response = client.patch('/users', headers=ADMIN, json=[{'user_id': first, 'first_name': 'Bob'},
+                                                           {'user_id': second, 'description': None}])
+
+    assert response.status_code == 200
+    assert response.json() == {'updated': [first, second], 'missing': []}
+    assert _user(app, first).first_name == 'Bob'
+    after = _user(app, second)
+    assert after.description is None
+    assert (after.first_name, after.email) == (before.first_name, before.email)
+
+
+def test_put_user_changes_only_the_fields_sent(app, client):
+    user_id, = _user_ids(app, 1)
+    before = _user(app, user_id)
+
+    response = client.put(f'/user-update/{user_id}', json={'last_name': 'Builder'})
+
+    assert response.status_code == 200
+    assert response.json()['last_name'] == 'Builder'
+    assert response.json()['email'] == before.email
+
+
+def test_required_fields_cannot_be_cleared(app, client):
+    user_id, = _user_ids(app, 1)
+    response = client.patch('/users', headers=ADMIN, json=[{'user_id': user_id, 'first_name': None}])
+    assert response.status_code == 422
+
+
+def test_patch_with_nothing_to_change(app, client):
+    user_id, = _user_ids(app, 1)
+    before = _user(app, user_id)
+
+    response = client.patch('/users', headers=ADMIN, json=[{'user_id': user_id}, {'user_id': 0}])
+
+    assert response.json() == {'updated': [user_id], 'missing': [0]}
+    assert _user(app, user_id).first_name == before.first_name